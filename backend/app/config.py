@@ -1,6 +1,12 @@
+import os
+
+# Skip the CoreSchema self-validation pass when models are built; it only
+# guards against pydantic bugs and dominates cold-start time.
+os.environ.setdefault("PYDANTIC_SKIP_VALIDATING_CORE_SCHEMAS", "true")
+
 from pydantic_settings import BaseSettings
-from typing import List
-from functools import lru_cache
+from typing import Literal, Tuple
+from functools import cached_property, lru_cache
 
 class Settings(BaseSettings):
     # Application
@@ -19,8 +25,13 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str
     MONGODB_DB_NAME: str = "ai_synapse_ocr"
-    MONGODB_MAX_POOL_SIZE: int = 10
+    MONGODB_MAX_POOL_SIZE: int = 100
     MONGODB_MIN_POOL_SIZE: int = 1
+    MONGODB_COMPRESSORS: str = "zstd,zlib"  # Negotiated with the server; zstd comes from the zstandard package, zlib is built in
+    # Fail fast instead of parking requests when no server or pooled connection is free
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 2000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 2000
+    MONGODB_READ_PREFERENCE: str = "primary"  # e.g. secondaryPreferred to spread reads over a replica set
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -38,6 +49,15 @@ class Settings(BaseSettings):
     OCR_CONFIDENCE_THRESHOLD: float = 0.6
     GPU_ENABLED: bool = False
     DEFAULT_OCR_ENGINE: str = "tesseract"
+    OCR_CASCADE_CONFIDENCE: float = 0.9  # Skip PaddleOCR/EasyOCR when Tesseract is at least this confident
+    OCR_WARMUP: bool = True  # Load and warm PaddleOCR/EasyOCR when the worker starts
+    OCR_NLM_DENOISE: bool = False  # Non-local means denoising; much slower than the default bilateral filter
+    MAX_CONCURRENT_OCR: int = 2  # Documents processed at once per worker; each can hold hundreds of MB
+    
+    # Embeddings
+    EMBEDDING_BACKEND: Literal["onnx", "torch"] = "onnx"
+    EMBEDDING_ONNX_FILE: str = "onnx/model_quint8_avx2.onnx"  # int8-quantized export shipped with the model
+    EMBEDDING_DTYPE: Literal["float32", "float16", "bfloat16"] = "float32"  # "float16" on GPU or "bfloat16" on CPUs with AMX/AVX-512-BF16; torch backend only
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
@@ -53,15 +73,15 @@ class Settings(BaseSettings):
         case_sensitive = True
         extra = "ignore"  # Changed from default to ignore extra fields
     
-    @property
-    def allowed_extensions_list(self) -> List[str]:
-        return self.ALLOWED_EXTENSIONS.split(',')
+    @cached_property
+    def allowed_extensions_list(self) -> Tuple[str, ...]:
+        return tuple(ext.strip() for ext in self.ALLOWED_EXTENSIONS.split(','))
     
-    @property
-    def cors_origins_list(self) -> List[str]:
-        return self.CORS_ORIGINS.split(',')
+    @cached_property
+    def cors_origins_list(self) -> Tuple[str, ...]:
+        return tuple(origin.strip() for origin in self.CORS_ORIGINS.split(','))
 
-@lru_cache()
+@lru_cache(maxsize=None)
 def get_settings() -> Settings:
     return Settings()
 
@@ -1,20 +1,18 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 import logging
 
 from .config import settings
 from .utils.database import connect_to_mongo, close_mongo_connection
+from .utils.task_queue import connect_to_redis, close_redis_connection
+from .utils.log_config import setup_logging
+from .utils.pagination import NEXT_CURSOR_HEADER
 from .routers import auth, upload, ocr, query, analytics
-from .middleware.rbac import RBACMiddleware
-from .middleware.error_handler import ErrorHandlerMiddleware
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+_log_listener = setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -24,20 +22,24 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting AI Synapse OCR API...")
     await connect_to_mongo()
+    await connect_to_redis()
     logger.info("Application started successfully")
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await close_redis_connection()
     await close_mongo_connection()
     logger.info("Application shut down successfully")
+    _log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="AI-OCR Based System for Automatic Table Extraction",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -48,12 +50,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Add custom middleware
-app.add_middleware(ErrorHandlerMiddleware)
-app.add_middleware(RBACMiddleware)
-
 # Include routers
 app.include_router(auth.router)
 app.include_router(upload.router)
@@ -85,13 +84,13 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     """Custom 404 handler"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=404,
         content={
             "error": "Not Found",
@@ -100,6 +99,20 @@ async def not_found_handler(request: Request, exc):
         }
     )
 
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Global handler for unhandled exceptions"""
+    logger.exception(f"Unhandled exception: {exc}")
+    
+    return ORJSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={
+            "error": "Internal server error",
+            "message": str(exc) if request.app.debug else "An unexpected error occurred",
+            "path": request.url.path
+        }
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,27 +0,0 @@
-from fastapi import Request, status
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging
-import traceback
-
-logger = logging.getLogger(__name__)
-
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
-    """Global error handler middleware"""
-    
-    async def dispatch(self, request: Request, call_next):
-        try:
-            response = await call_next(request)
-            return response
-        except Exception as e:
-            logger.error(f"Unhandled exception: {str(e)}")
-            logger.error(traceback.format_exc())
-            
-            return JSONResponse(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                content={
-                    "error": "Internal server error",
-                    "message": str(e) if request.app.debug else "An unexpected error occurred",
-                    "path": request.url.path
-                }
-            )
\ No newline at end of file
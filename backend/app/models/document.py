@@ -1,10 +1,14 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
 class DocumentStatus(str, Enum):
     UPLOADED = "uploaded"
+    QUEUED = "queued"
     PREPROCESSING = "preprocessing"
     OCR_PROCESSING = "ocr_processing"
     TABLE_EXTRACTION = "table_extraction"
@@ -24,7 +28,9 @@ class DocumentMetadata(BaseModel):
     mime_type: str
     page_count: int = 0
     table_count: int = 0
-    upload_date: datetime = Field(default_factory=datetime.utcnow)
+    upload_date: datetime = Field(default_factory=_now)
+    
+    model_config = ConfigDict(defer_build=True)
 
 class OCRResult(BaseModel):
     engine: OCREngine
@@ -32,6 +38,8 @@ class OCRResult(BaseModel):
     confidence: float
     processing_time: float
     page_number: int
+    
+    model_config = ConfigDict(defer_build=True)
 
 class TableData(BaseModel):
     table_id: str
@@ -42,12 +50,16 @@ class TableData(BaseModel):
     data: List[List[str]]
     confidence: float
     extraction_method: str
+    
+    model_config = ConfigDict(defer_build=True)
 
 class DocumentBase(BaseModel):
     user_id: str
     metadata: DocumentMetadata
     status: DocumentStatus = DocumentStatus.UPLOADED
     
+    model_config = ConfigDict(defer_build=True)
+    
 class DocumentCreate(DocumentBase):
     gridfs_id: str  # GridFS file ID
 
@@ -57,14 +69,13 @@ class DocumentInDB(DocumentBase):
     ocr_results: List[OCRResult] = []
     tables: List[TableData] = []
     embeddings_generated: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=_now)
+    updated_at: datetime = Field(default_factory=_now)
     processing_started_at: Optional[datetime] = None
     processing_completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
     
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
 
 class DocumentResponse(BaseModel):
     id: str = Field(alias="_id")
@@ -75,8 +86,7 @@ class DocumentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
 
 class DocumentDetailResponse(DocumentResponse):
     ocr_results: List[OCRResult] = []
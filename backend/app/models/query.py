@@ -1,6 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
 
 class Citation(BaseModel):
     document_id: str
@@ -8,11 +11,15 @@ class Citation(BaseModel):
     table_id: Optional[str] = None
     text_snippet: str
     confidence: float
+    
+    model_config = ConfigDict(defer_build=True)
 
 class QueryRequest(BaseModel):
     query: str
     document_ids: Optional[List[str]] = None  # Filter by specific documents
     top_k: int = 5  # Number of results to return
+    
+    model_config = ConfigDict(defer_build=True)
 
 class QueryResponse(BaseModel):
     query: str
@@ -20,6 +27,8 @@ class QueryResponse(BaseModel):
     citations: List[Citation]
     confidence: float
     processing_time: float
+    
+    model_config = ConfigDict(defer_build=True)
 
 class QueryHistory(BaseModel):
     id: str = Field(alias="_id")
@@ -27,7 +36,6 @@ class QueryHistory(BaseModel):
     query: str
     answer: str
     citations: List[Citation]
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_now)
     
-    class Config:
-        populate_by_name = True
\ No newline at end of file
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -12,6 +12,8 @@ class UserBase(BaseModel):
     email: EmailStr
     full_name: str
     role: UserRole = UserRole.MEMBER
+    
+    model_config = ConfigDict(defer_build=True)
 
 class UserCreate(UserBase):
     password: str
@@ -20,6 +22,8 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     role: Optional[UserRole] = None
     is_active: Optional[bool] = None
+    
+    model_config = ConfigDict(defer_build=True)
 
 class UserInDB(UserBase):
     id: str = Field(alias="_id")
@@ -31,8 +35,7 @@ class UserInDB(UserBase):
     query_count: int = 0
     storage_used: int = 0  # in bytes
     
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
 
 class UserResponse(UserBase):
     id: str = Field(alias="_id")
@@ -42,14 +45,17 @@ class UserResponse(UserBase):
     query_count: int
     storage_used: int
     
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
 
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    
+    model_config = ConfigDict(defer_build=True)
 
 class TokenData(BaseModel):
     user_id: Optional[str] = None
     email: Optional[str] = None
-    role: Optional[str] = None
\ No newline at end of file
+    role: Optional[str] = None
+    
+    model_config = ConfigDict(defer_build=True)
\ No newline at end of file
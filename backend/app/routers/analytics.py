@@ -1,8 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, List
-from datetime import datetime, timedelta
+from fastapi.responses import ORJSONResponse
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+import asyncio
+import re
+import time
 
+from ..config import settings
+from ..middleware.rbac import require_roles
 from ..models.user import UserInDB, UserRole
 from ..routers.auth import get_current_user
 from ..utils.database import get_database
@@ -12,108 +18,160 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
-async def require_admin(current_user: UserInDB = Depends(get_current_user)):
-    """Require admin role"""
-    if current_user.role != UserRole.ADMIN:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    return current_user
+# Process-local TTL cache for expensive, slowly-changing aggregates
+DASHBOARD_CACHE_TTL = 30
+DOCUMENT_TYPES_CACHE_TTL = 60
+OCR_PERFORMANCE_CACHE_TTL = 120
+
+_analytics_cache: Dict[Any, Tuple[float, Any]] = {}
+
+# Error message categories, checked in priority order
+_ERROR_CATEGORY_RE = re.compile(
+    r"(?=.*?(?P<Timeout>timeout))|(?=.*?(?P<Memory>memory))|(?=.*?(?P<Format>format))",
+    re.IGNORECASE | re.DOTALL
+)
+
+def _cache_get(key: Any, ttl: float) -> Optional[Any]:
+    """Return a cached value if it is younger than `ttl` seconds"""
+    entry = _analytics_cache.get(key)
+    if entry and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+    return None
+
+def _cache_set(key: Any, value: Any) -> Any:
+    """Store a value in the analytics cache and return it"""
+    _analytics_cache[key] = (time.monotonic(), value)
+    return value
+
+# Admin-only endpoints; /my-stats stays open to any authenticated user
+require_admin = require_roles(UserRole.ADMIN)
+
+def _facet_count(facet_result: Dict, key: str) -> int:
+    """Read a `$count` sub-pipeline result out of a `$facet` stage"""
+    counts = facet_result.get(key) or []
+    return counts[0]["n"] if counts else 0
 
 @router.get("/dashboard")
 async def get_dashboard_stats(
     current_user: UserInDB = Depends(require_admin)
 ):
     """Get overall system statistics"""
+    # Trusted, JSON-native payload: hand it straight to orjson and skip
+    # FastAPI's recursive jsonable_encoder pass
+    cached = _cache_get("dashboard", DASHBOARD_CACHE_TTL)
+    if cached is not None:
+        return ORJSONResponse(content=cached)
+    
     db = get_database()
     
     try:
-        # Total documents
-        total_documents = await db.documents.count_documents({})
+        thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
         
-        # Documents by status
-        pipeline = [
+        # Document statistics in a single round-trip
+        documents_pipeline = [
             {
-                "$group": {
-                    "_id": "$status",
-                    "count": {"$sum": 1}
+                "$facet": {
+                    "total": [{"$count": "n"}],
+                    "by_status": [
+                        {
+                            "$group": {
+                                "_id": "$status",
+                                "count": {"$sum": 1}
+                            }
+                        }
+                    ],
+                    "recent": [
+                        {"$match": {"created_at": {"$gte": thirty_days_ago}}},
+                        {"$count": "n"}
+                    ],
+                    "accuracy": [
+                        {"$unwind": "$ocr_results"},
+                        {
+                            "$group": {
+                                "_id": None,
+                                "avg_confidence": {"$avg": "$ocr_results.confidence"},
+                                "total_pages": {"$sum": 1}
+                            }
+                        }
+                    ],
+                    "processing": [
+                        {
+                            "$match": {
+                                "processing_started_at": {"$exists": True},
+                                "processing_completed_at": {"$exists": True}
+                            }
+                        },
+                        {
+                            "$project": {
+                                "processing_time": {
+                                    "$divide": [
+                                        {"$subtract": ["$processing_completed_at", "$processing_started_at"]},
+                                        1000
+                                    ]
+                                }
+                            }
+                        },
+                        {
+                            "$group": {
+                                "_id": None,
+                                "avg_time": {"$avg": "$processing_time"}
+                            }
+                        }
+                    ]
                 }
             }
         ]
-        status_counts = await db.documents.aggregate(pipeline).to_list(length=None)
-        
-        # Total users
-        total_users = await db.users.count_documents({})
-        active_users = await db.users.count_documents({"is_active": True})
         
-        # Recent activity (last 30 days)
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_uploads = await db.documents.count_documents({
-            "created_at": {"$gte": thirty_days_ago}
-        })
-        
-        recent_queries = await db.query_history.count_documents({
-            "timestamp": {"$gte": thirty_days_ago}
-        })
-        
-        # OCR accuracy stats
-        pipeline = [
-            {"$unwind": "$ocr_results"},
+        # User statistics in a single round-trip
+        users_pipeline = [
             {
-                "$group": {
-                    "_id": None,
-                    "avg_confidence": {"$avg": "$ocr_results.confidence"},
-                    "total_pages": {"$sum": 1}
+                "$facet": {
+                    "total": [{"$count": "n"}],
+                    "active": [
+                        {"$match": {"is_active": True}},
+                        {"$count": "n"}
+                    ],
+                    "storage": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "total_storage": {"$sum": "$storage_used"}
+                            }
+                        }
+                    ]
                 }
             }
         ]
-        accuracy_stats = await db.documents.aggregate(pipeline).to_list(length=1)
         
+        # The three collections are independent, so query them concurrently
+        documents_result, users_result, recent_queries = await asyncio.gather(
+            db.documents.aggregate(documents_pipeline).to_list(length=1),
+            db.users.aggregate(users_pipeline).to_list(length=1),
+            db.query_history.count_documents({
+                "timestamp": {"$gte": thirty_days_ago}
+            })
+        )
+        documents_stats = documents_result[0]
+        users_stats = users_result[0]
+        
+        total_documents = _facet_count(documents_stats, "total")
+        recent_uploads = _facet_count(documents_stats, "recent")
+        status_counts = documents_stats["by_status"]
+        
+        accuracy_stats = documents_stats["accuracy"]
         avg_accuracy = accuracy_stats[0]["avg_confidence"] if accuracy_stats else 0.0
         total_pages = accuracy_stats[0]["total_pages"] if accuracy_stats else 0
         
-        # Processing time stats
-        pipeline = [
-            {
-                "$match": {
-                    "processing_started_at": {"$exists": True},
-                    "processing_completed_at": {"$exists": True}
-                }
-            },
-            {
-                "$project": {
-                    "processing_time": {
-                        "$divide": [
-                            {"$subtract": ["$processing_completed_at", "$processing_started_at"]},
-                            1000
-                        ]
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_time": {"$avg": "$processing_time"}
-                }
-            }
-        ]
-        time_stats = await db.documents.aggregate(pipeline).to_list(length=1)
+        time_stats = documents_stats["processing"]
         avg_processing_time = time_stats[0]["avg_time"] if time_stats else 0.0
         
-        # Storage usage
-        pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "total_storage": {"$sum": "$storage_used"}
-                }
-            }
-        ]
-        storage_stats = await db.users.aggregate(pipeline).to_list(length=1)
+        total_users = _facet_count(users_stats, "total")
+        active_users = _facet_count(users_stats, "active")
+        
+        storage_stats = users_stats["storage"]
         total_storage = storage_stats[0]["total_storage"] if storage_stats else 0
         
-        return {
+        dashboard = _cache_set("dashboard", {
             "documents": {
                 "total": total_documents,
                 "by_status": {item["_id"]: item["count"] for item in status_counts},
@@ -136,7 +194,8 @@ async def get_dashboard_stats(
                 "total_mb": round(total_storage / (1024 * 1024), 2),
                 "total_gb": round(total_storage / (1024 * 1024 * 1024), 2)
             }
-        }
+        })
+        return ORJSONResponse(content=dashboard)
     
     except Exception as e:
         logger.error(f"Error fetching analytics: {e}")
@@ -151,9 +210,13 @@ async def get_ocr_performance(
     current_user: UserInDB = Depends(require_admin)
 ):
     """Get OCR performance metrics over time"""
+    cached = _cache_get(("ocr-performance", days), OCR_PERFORMANCE_CACHE_TTL)
+    if cached is not None:
+        return cached
+    
     db = get_database()
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = datetime.now(timezone.utc) - timedelta(days=days)
     
     pipeline = [
         {
@@ -190,20 +253,19 @@ async def get_ocr_performance(
     results = await db.documents.aggregate(pipeline).to_list(length=None)
     
     # Format results
-    performance_data = defaultdict(lambda: defaultdict(dict))
+    performance_data: Dict[str, Dict[str, Dict[str, Any]]] = {}
     
     for item in results:
-        date = item["_id"]["date"]
-        engine = item["_id"]["engine"]
-        performance_data[date][engine] = {
+        key = item["_id"]
+        performance_data.setdefault(key["date"], {})[key["engine"]] = {
             "avg_confidence": round(item["avg_confidence"] * 100, 2),
             "count": item["count"]
         }
     
-    return {
+    return _cache_set(("ocr-performance", days), {
         "period_days": days,
-        "data": dict(performance_data)
-    }
+        "data": performance_data
+    })
 
 @router.get("/user-activity")
 async def get_user_activity(
@@ -213,29 +275,42 @@ async def get_user_activity(
     """Get recent user activity"""
     db = get_database()
     
-    cursor = db.audit_logs.find({}).sort("timestamp", -1).limit(limit)
-    activities = await cursor.to_list(length=limit)
-    
-    # Format activities
-    formatted_activities = []
-    for activity in activities:
-        # Get user info
-        user = await db.users.find_one({"_id": activity["user_id"]})
-        
-        formatted_activities.append({
-            "timestamp": activity["timestamp"].isoformat(),
-            "user_email": user["email"] if user else "Unknown",
-            "action": activity["action"],
-            "details": activity.get("details", {})
-        })
+    # Join audit logs with their users server-side
+    pipeline = [
+        {"$sort": {"timestamp": -1}},
+        {"$limit": limit},
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "user_id",
+                "foreignField": "_id",
+                "as": "user"
+            }
+        },
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "_id": 0,
+                "timestamp": 1,
+                "user_email": {"$ifNull": ["$user.email", "Unknown"]},
+                "action": 1,
+                "details": {"$ifNull": ["$details", {}]}
+            }
+        }
+    ]
     
-    return formatted_activities
+    # Rows already have the response shape; orjson serializes the datetimes
+    return await db.audit_logs.aggregate(pipeline).to_list(length=limit)
 
 @router.get("/document-types")
 async def get_document_types_distribution(
     current_user: UserInDB = Depends(require_admin)
 ):
     """Get distribution of document types"""
+    cached = _cache_get("document-types", DOCUMENT_TYPES_CACHE_TTL)
+    if cached is not None:
+        return cached
+    
     db = get_database()
     
     pipeline = [
@@ -251,14 +326,14 @@ async def get_document_types_distribution(
     
     results = await db.documents.aggregate(pipeline).to_list(length=None)
     
-    return [
+    return _cache_set("document-types", [
         {
             "type": item["_id"],
             "count": item["count"],
             "total_size_mb": round(item["total_size"] / (1024 * 1024), 2)
         }
         for item in results
-    ]
+    ])
 
 @router.get("/error-analysis")
 async def get_error_analysis(
@@ -268,27 +343,23 @@ async def get_error_analysis(
     """Get error analysis"""
     db = get_database()
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = datetime.now(timezone.utc) - timedelta(days=days)
     
     # Failed documents
-    failed_docs = await db.documents.find({
-        "status": "failed",
-        "updated_at": {"$gte": start_date}
-    }).to_list(length=100)
+    failed_docs = await db.documents.find(
+        {
+            "status": "failed",
+            "updated_at": {"$gte": start_date}
+        },
+        {"_id": 1, "updated_at": 1, "error_message": 1}
+    ).to_list(length=100)
     
     # Analyze error messages
     error_categories = defaultdict(int)
     for doc in failed_docs:
         error_msg = doc.get("error_message", "Unknown error")
-        # Simple categorization
-        if "timeout" in error_msg.lower():
-            error_categories["Timeout"] += 1
-        elif "memory" in error_msg.lower():
-            error_categories["Memory"] += 1
-        elif "format" in error_msg.lower():
-            error_categories["Format"] += 1
-        else:
-            error_categories["Other"] += 1
+        match = _ERROR_CATEGORY_RE.match(error_msg)
+        error_categories[match.lastgroup if match else "Other"] += 1
     
     return {
         "period_days": days,
@@ -297,7 +368,7 @@ async def get_error_analysis(
         "recent_errors": [
             {
                 "document_id": str(doc["_id"]),
-                "timestamp": doc["updated_at"].isoformat(),
+                "timestamp": doc["updated_at"],
                 "error": doc.get("error_message", "Unknown")[:200]
             }
             for doc in failed_docs[:10]
@@ -311,42 +382,71 @@ async def get_my_statistics(
     """Get current user's statistics"""
     db = get_database()
     
-    # User's documents
-    total_docs = await db.documents.count_documents({"user_id": current_user.id})
-    completed_docs = await db.documents.count_documents({
-        "user_id": current_user.id,
-        "status": "completed"
-    })
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
     
-    # User's queries
-    total_queries = await db.query_history.count_documents({"user_id": current_user.id})
-    
-    # Recent activity (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_docs = await db.documents.count_documents({
-        "user_id": current_user.id,
-        "created_at": {"$gte": seven_days_ago}
-    })
-    
-    recent_queries = await db.query_history.count_documents({
-        "user_id": current_user.id,
-        "timestamp": {"$gte": seven_days_ago}
-    })
+    # User's documents in a single round-trip
+    documents_pipeline = [
+        {"$match": {"user_id": current_user.id}},
+        {
+            "$facet": {
+                "total": [{"$count": "n"}],
+                "completed": [
+                    {"$match": {"status": "completed"}},
+                    {"$count": "n"}
+                ],
+                "recent": [
+                    {"$match": {"created_at": {"$gte": seven_days_ago}}},
+                    {"$count": "n"}
+                ],
+                "accuracy": [
+                    {"$unwind": "$ocr_results"},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "avg_confidence": {"$avg": "$ocr_results.confidence"}
+                        }
+                    }
+                ]
+            }
+        }
+    ]
     
-    # Average accuracy
-    pipeline = [
+    # User's queries in a single round-trip
+    queries_pipeline = [
         {"$match": {"user_id": current_user.id}},
-        {"$unwind": "$ocr_results"},
         {
-            "$group": {
-                "_id": None,
-                "avg_confidence": {"$avg": "$ocr_results.confidence"}
+            "$facet": {
+                "total": [{"$count": "n"}],
+                "recent": [
+                    {"$match": {"timestamp": {"$gte": seven_days_ago}}},
+                    {"$count": "n"}
+                ]
             }
         }
     ]
-    accuracy_stats = await db.documents.aggregate(pipeline).to_list(length=1)
+    
+    documents_result, queries_result = await asyncio.gather(
+        db.documents.aggregate(documents_pipeline).to_list(length=1),
+        db.query_history.aggregate(queries_pipeline).to_list(length=1)
+    )
+    documents_stats = documents_result[0]
+    queries_stats = queries_result[0]
+    
+    total_docs = _facet_count(documents_stats, "total")
+    completed_docs = _facet_count(documents_stats, "completed")
+    recent_docs = _facet_count(documents_stats, "recent")
+    
+    total_queries = _facet_count(queries_stats, "total")
+    recent_queries = _facet_count(queries_stats, "recent")
+    
+    accuracy_stats = documents_stats["accuracy"]
     avg_accuracy = accuracy_stats[0]["avg_confidence"] if accuracy_stats else 0.0
     
+    upload_limit = settings.AUTHENTICATED_UPLOAD_LIMIT
+    query_limit = settings.AUTHENTICATED_QUERY_LIMIT
+    uploads_used = current_user.upload_count
+    queries_used = current_user.query_count
+    
     return {
         "documents": {
             "total": total_docs,
@@ -364,7 +464,7 @@ async def get_my_statistics(
             "used_mb": round(current_user.storage_used / (1024 * 1024), 2)
         },
         "limits": {
-            "uploads_remaining": max(0, settings.AUTHENTICATED_UPLOAD_LIMIT - current_user.upload_count),
-            "queries_remaining": max(0, settings.AUTHENTICATED_QUERY_LIMIT - current_user.query_count)
+            "uploads_remaining": max(0, upload_limit - uploads_used),
+            "queries_remaining": max(0, query_limit - queries_used)
         }
     }
\ No newline at end of file
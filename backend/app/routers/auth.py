@@ -11,6 +11,12 @@ router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+def _to_user_response(user: UserInDB) -> UserResponse:
+    """Build a UserResponse from an already-validated UserInDB without re-validating"""
+    return UserResponse.model_construct(
+        **{name: getattr(user, name) for name in UserResponse.model_fields}
+    )
+
 async def get_auth_service():
     db = get_database()
     return AuthService(db)
@@ -40,7 +46,7 @@ async def register(
     """Register a new user"""
     try:
         user = await auth_service.create_user(user_data)
-        return UserResponse(**user.dict())
+        return _to_user_response(user)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -72,7 +78,7 @@ async def get_current_user_info(
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Get current user information"""
-    return UserResponse(**current_user.dict())
+    return _to_user_response(current_user)
 
 @router.post("/logout")
 async def logout(current_user: UserInDB = Depends(get_current_user)):
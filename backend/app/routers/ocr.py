@@ -1,154 +1,267 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Optional, List
 from bson import ObjectId
+from pymongo import ReturnDocument
+from datetime import datetime, timezone
 import asyncio
 import io
+import os
+import numpy as np
 from PIL import Image
 
 from ..models.document import DocumentStatus, DocumentDetailResponse, OCREngine
 from ..models.user import UserInDB
 from ..routers.auth import get_current_user
-from ..services.ocr_service import OCRService
+from ..services.ocr_service import OCRService, OCR_PAGE_CONCURRENCY
 from ..services.preprocessing_service import PreprocessingService
 from ..services.table_detection_service import TableDetectionService
 from ..services.embedding_service import EmbeddingService
 from ..utils.database import get_database, get_gridfs
+from ..utils.task_queue import get_task_queue
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ocr", tags=["OCR Processing"])
 
+# Fields read by the status endpoint; skips the OCR and table payloads
+STATUS_PROJECTION = {
+    "user_id": 1,
+    "status": 1,
+    "metadata.page_count": 1,
+    "metadata.table_count": 1,
+    "embeddings_generated": 1,
+    "processing_started_at": 1,
+    "processing_completed_at": 1,
+    "error_message": 1
+}
+
+# Statuses a document passes through while a worker is processing it
+PROCESSING_STATUSES = [
+    DocumentStatus.PREPROCESSING.value,
+    DocumentStatus.OCR_PROCESSING.value,
+    DocumentStatus.TABLE_EXTRACTION.value,
+    DocumentStatus.EMBEDDING_GENERATION.value
+]
+
+# Embeddings per insert_many call, keeping each batch well under the 16MB BSON limit
+EMBEDDING_INSERT_BATCH_SIZE = 500
+
+# Page pipeline: preprocessing -> OCR -> text embedding, joined by bounded queues
+PIPELINE_PREPROCESS_WORKERS = os.cpu_count() or 1
+PIPELINE_OCR_WORKERS = OCR_PAGE_CONCURRENCY
+PIPELINE_QUEUE_SIZE = 4
+
 # Initialize services
 ocr_service = OCRService()
 preprocessing_service = PreprocessingService()
 table_service = TableDetectionService()
 embedding_service = EmbeddingService()
 
+async def run_page_pipeline(images: List[np.ndarray]):
+    """Preprocess, OCR and embed pages as a pipeline so the stages overlap
+    
+    Returns (preprocessed_images, ocr_results, text_embeddings). Images and OCR
+    results are in page order; text embeddings are in the order pages finish OCR.
+    Raw pages are released from `images` as soon as they are preprocessed.
+    """
+    ocr_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    embed_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    pages = iter(range(len(images)))
+    preprocessed_images = [None] * len(images)
+    ocr_results = {}
+    text_embeddings = []
+    
+    async def preprocess_worker():
+        for index in pages:
+            image = await preprocessing_service.preprocess_image(images[index])
+            images[index] = None
+            preprocessed_images[index] = image
+            await ocr_queue.put((index + 1, image))
+    
+    async def ocr_worker():
+        while (item := await ocr_queue.get()) is not None:
+            page_number, image = item
+            page_results = await ocr_service.extract_text_multi_engine(image, page_number)
+            best_result = ocr_service.select_best_result(page_results)
+            if best_result:
+                ocr_results[page_number] = best_result
+                await embed_queue.put(best_result)
+    
+    async def embed_worker():
+        # Encode whatever pages have queued up together as one micro-batch
+        done = False
+        while not done:
+            batch = [await embed_queue.get()]
+            while not embed_queue.empty():
+                batch.append(embed_queue.get_nowait())
+            done = None in batch
+            batch = [result for result in batch if result is not None]
+            if batch:
+                text_embeddings.extend(await embedding_service.create_text_embeddings(batch))
+    
+    async def run_stage(workers, downstream: asyncio.Queue, consumers: int):
+        await asyncio.gather(*workers)
+        for _ in range(consumers):
+            await downstream.put(None)
+    
+    tasks = [
+        asyncio.ensure_future(run_stage(
+            [preprocess_worker() for _ in range(PIPELINE_PREPROCESS_WORKERS)],
+            ocr_queue,
+            PIPELINE_OCR_WORKERS
+        )),
+        asyncio.ensure_future(run_stage(
+            [ocr_worker() for _ in range(PIPELINE_OCR_WORKERS)],
+            embed_queue,
+            1
+        )),
+        asyncio.ensure_future(embed_worker())
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Don't leave the other stages blocked on their queues
+        for task in tasks:
+            task.cancel()
+        raise
+    
+    return (
+        preprocessed_images,
+        [ocr_results[page_number] for page_number in sorted(ocr_results)],
+        text_embeddings
+    )
+
 async def process_document_background(document_id: str):
-    """Background task to process document"""
+    """Process a document; runs in the OCR worker (app.worker)"""
     db = get_database()
     gridfs = get_gridfs()
     
     try:
         logger.info(f"Starting OCR processing for document {document_id}")
         
-        # Update status
-        await db.documents.update_one(
-            {"_id": document_id},
+        # Claim the queued document and fetch it in one round-trip; a retried or duplicate
+        # job finds it no longer QUEUED and leaves it to whichever run owns it
+        started_at = datetime.now(timezone.utc)
+        document = await db.documents.find_one_and_update(
+            {"_id": document_id, "status": DocumentStatus.QUEUED.value},
             {
                 "$set": {
                     "status": DocumentStatus.PREPROCESSING.value,
-                    "processing_started_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
+                    "processing_started_at": started_at,
+                    "updated_at": started_at
                 }
-            }
+            },
+            projection={"gridfs_id": 1, "metadata.original_filename": 1},
+            return_document=ReturnDocument.AFTER
         )
-        
-        # Get document
-        document = await db.documents.find_one({"_id": document_id})
         if not document:
-            raise Exception("Document not found")
+            logger.info(f"Document {document_id} is no longer queued, skipping")
+            return
         
-        # Download file from GridFS
+        # Download file from GridFS chunk by chunk into a single buffer
         grid_out = await gridfs.open_download_stream(ObjectId(document["gridfs_id"]))
-        file_data = await grid_out.read()
+        file_buffer = io.BytesIO()
+        async for chunk in grid_out:
+            file_buffer.write(chunk)
+        file_buffer.seek(0)
         
         # Determine file type and convert to images
         filename = document["metadata"]["original_filename"]
         
         if filename.lower().endswith('.pdf'):
-            # Save temporarily and convert
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                tmp.write(file_data)
-                tmp_path = tmp.name
-            
-            images = await preprocessing_service.convert_pdf_to_images(tmp_path)
-            os.unlink(tmp_path)
+            images = await preprocessing_service.convert_pdf_bytes_to_images(file_buffer.getbuffer())
         else:
             # Single image
-            image = Image.open(io.BytesIO(file_data))
+            image = Image.open(file_buffer)
             images = [np.array(image)]
+            del image
         
-        # Update page count
-        await db.documents.update_one(
-            {"_id": document_id},
-            {"$set": {"metadata.page_count": len(images)}}
-        )
-        
-        # Preprocess images
-        preprocessed_images = []
-        for img in images:
-            processed = await preprocessing_service.preprocess_image(img)
-            preprocessed_images.append(processed)
+        # Drop each large intermediate as soon as its last consumer is done,
+        # so peak memory is the largest stage rather than the sum of all of them
+        del file_buffer, grid_out
         
-        # OCR Processing
+        # Preprocessing, OCR and text embedding overlap page by page from here on
+        # (each status write also carries the previous stage's output)
         await db.documents.update_one(
             {"_id": document_id},
-            {"$set": {"status": DocumentStatus.OCR_PROCESSING.value}}
-        )
-        
-        ocr_results = await ocr_service.process_document(
-            preprocessed_images,
-            use_multi_engine=True
+            {
+                "$set": {
+                    "status": DocumentStatus.OCR_PROCESSING.value,
+                    "metadata.page_count": len(images)
+                }
+            }
         )
         
-        # Save OCR results
-        ocr_results_dict = [result.dict() for result in ocr_results]
-        await db.documents.update_one(
-            {"_id": document_id},
-            {"$set": {"ocr_results": ocr_results_dict}}
-        )
+        preprocessed_images, ocr_results, text_embeddings = await run_page_pipeline(images)
+        del images
         
         # Table Extraction
+        ocr_results_dict = [result.model_dump() for result in ocr_results]
         await db.documents.update_one(
             {"_id": document_id},
-            {"$set": {"status": DocumentStatus.TABLE_EXTRACTION.value}}
+            {
+                "$set": {
+                    "status": DocumentStatus.TABLE_EXTRACTION.value,
+                    "ocr_results": ocr_results_dict
+                }
+            }
         )
+        del ocr_results_dict
         
         tables = await table_service.process_document_tables(
             preprocessed_images,
             ocr_results
         )
+        del preprocessed_images, ocr_results
         
-        # Save tables
-        tables_dict = [table.dict() for table in tables]
+        # Embedding Generation
+        tables_dict = [table.model_dump() for table in tables]
         await db.documents.update_one(
             {"_id": document_id},
             {
                 "$set": {
+                    "status": DocumentStatus.EMBEDDING_GENERATION.value,
                     "tables": tables_dict,
                     "metadata.table_count": len(tables)
                 }
             }
         )
+        del tables_dict
         
-        # Embedding Generation
-        await db.documents.update_one(
-            {"_id": document_id},
-            {"$set": {"status": DocumentStatus.EMBEDDING_GENERATION.value}}
-        )
+        embeddings_data = text_embeddings + await embedding_service.create_table_embeddings(tables)
+        del text_embeddings, tables
         
-        embeddings_data = await embedding_service.create_document_embeddings(
-            ocr_results,
-            tables
-        )
-        
-        # Save embeddings
+        # Save embeddings in unordered batches, written concurrently
         for emb in embeddings_data:
             emb['document_id'] = document_id
-            await db.embeddings.insert_one(emb)
+        try:
+            # Let every batch settle before cleaning up, so none lands after the delete
+            results = await asyncio.gather(
+                *(
+                    db.embeddings.insert_many(embeddings_data[i:i + EMBEDDING_INSERT_BATCH_SIZE], ordered=False)
+                    for i in range(0, len(embeddings_data), EMBEDDING_INSERT_BATCH_SIZE)
+                ),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        except BaseException:
+            # Don't leave a partial set of rows behind for search or the next attempt
+            await db.embeddings.delete_many({"document_id": document_id})
+            raise
         
         # Mark as completed
+        completed_at = datetime.now(timezone.utc)
         await db.documents.update_one(
             {"_id": document_id},
             {
                 "$set": {
                     "status": DocumentStatus.COMPLETED.value,
                     "embeddings_generated": True,
-                    "processing_completed_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
+                    "processing_completed_at": completed_at,
+                    "updated_at": completed_at
                 }
             }
         )
@@ -157,52 +270,105 @@ async def process_document_background(document_id: str):
     
     except Exception as e:
         logger.error(f"Error processing document {document_id}: {e}")
-        
-        # Mark as failed
-        await db.documents.update_one(
-            {"_id": document_id},
-            {
-                "$set": {
-                    "status": DocumentStatus.FAILED.value,
-                    "error_message": str(e),
-                    "updated_at": datetime.utcnow()
-                }
+        await mark_document_failed(document_id, str(e))
+
+async def requeue_document(document_id: str):
+    """Put an interrupted document back in QUEUED so the job's retry can claim it"""
+    await get_database().documents.update_one(
+        {"_id": document_id, "status": {"$in": PROCESSING_STATUSES}},
+        {
+            "$set": {
+                "status": DocumentStatus.QUEUED.value,
+                "updated_at": datetime.now(timezone.utc)
             }
-        )
+        }
+    )
+
+async def mark_document_failed(document_id: str, error_message: str):
+    """Record a processing failure so the document can be submitted again"""
+    await get_database().documents.update_one(
+        {"_id": document_id},
+        {
+            "$set": {
+                "status": DocumentStatus.FAILED.value,
+                "error_message": error_message,
+                "updated_at": datetime.now(timezone.utc)
+            }
+        }
+    )
 
 @router.post("/{document_id}/process")
 async def start_ocr_processing(
     document_id: str,
-    background_tasks: BackgroundTasks,
     engines: Optional[List[OCREngine]] = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Start OCR processing for a document"""
     db = get_database()
     
-    # Check document exists and belongs to user
-    document = await db.documents.find_one({"_id": document_id})
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
+    # Claim the document for processing atomically: only the caller's own
+    # uploaded/failed documents move to QUEUED, so concurrent calls can't both win
+    claimed = await db.documents.find_one_and_update(
+        {
+            "_id": document_id,
+            "user_id": current_user.id,
+            "status": {"$in": [DocumentStatus.UPLOADED.value, DocumentStatus.FAILED.value]}
+        },
+        {
+            "$set": {
+                "status": DocumentStatus.QUEUED.value,
+                "updated_at": datetime.now(timezone.utc)
+            }
+        },
+        projection={"_id": 1}
+    )
     
-    if document["user_id"] != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
+    if not claimed:
+        # Work out why the claim failed
+        document = await db.documents.find_one(
+            {"_id": document_id},
+            {"user_id": 1, "status": 1}
         )
-    
-    if document["status"] not in [DocumentStatus.UPLOADED.value, DocumentStatus.FAILED.value]:
+        
+        if not document:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found"
+            )
+        
+        if document["user_id"] != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
+        
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Document is already being processed or completed (status: {document['status']})"
         )
     
-    # Start background processing
-    background_tasks.add_task(process_document_background, document_id)
+    # Hand off to the OCR worker pool (see app/worker.py)
+    try:
+        task_queue = get_task_queue()
+        if task_queue is None:
+            raise RuntimeError("task queue is not connected")
+        await task_queue.enqueue_job("process_document_task", document_id)
+    except Exception as e:
+        logger.error(f"Failed to queue document {document_id}: {e}")
+        # Release the claim so the document can be submitted again
+        await db.documents.update_one(
+            {"_id": document_id, "status": DocumentStatus.QUEUED.value},
+            {
+                "$set": {
+                    "status": DocumentStatus.UPLOADED.value,
+                    "updated_at": datetime.now(timezone.utc)
+                }
+            }
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Processing queue unavailable, please try again later"
+        )
     
     return {
         "message": "OCR processing started",
@@ -218,7 +384,10 @@ async def get_processing_status(
     """Get OCR processing status"""
     db = get_database()
     
-    document = await db.documents.find_one({"_id": document_id})
+    document = await db.documents.find_one(
+        {"_id": document_id},
+        STATUS_PROJECTION
+    )
     
     if not document:
         raise HTTPException(
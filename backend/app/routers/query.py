@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import List, Optional
+from datetime import datetime, timezone
 
 from ..models.query import QueryRequest, QueryResponse, QueryHistory
 from ..models.user import UserInDB
@@ -7,7 +8,8 @@ from ..routers.auth import get_current_user
 from ..services.rag_service import RAGService
 from ..services.embedding_service import EmbeddingService
 from ..services.auth_service import AuthService
-from ..utils.database import get_database
+from ..utils.database import get_database, get_audit_logs
+from ..utils.pagination import NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, keyset_filter
 from ..config import settings
 import logging
 
@@ -23,8 +25,10 @@ async def query_documents(
     """Query documents using natural language"""
     db = get_database()
     
-    # Check query limit
-    if current_user.query_count >= settings.AUTHENTICATED_QUERY_LIMIT:
+    # Check query limit; the stored count is checked and bumped in one update,
+    # since the cached user may be stale in this process
+    auth_service = AuthService(db)
+    if not await auth_service.reserve_query(current_user.id, settings.AUTHENTICATED_QUERY_LIMIT):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Query limit reached"
@@ -38,22 +42,19 @@ async def query_documents(
         # Process query
         response = await rag_service.process_query(query_request, current_user.id)
         
-        # Increment query count
-        auth_service = AuthService(db)
-        await auth_service.increment_query_count(current_user.id)
-        
         # Log to audit
-        await db.audit_logs.insert_one({
+        await get_audit_logs().insert_one({
             "user_id": current_user.id,
             "action": "query",
             "query": query_request.query,
-            "timestamp": datetime.utcnow()
+            "timestamp": datetime.now(timezone.utc)
         })
         
         return response
     
     except Exception as e:
         logger.error(f"Query error: {e}")
+        await auth_service.release_query(current_user.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Query processing failed: {str(e)}"
@@ -61,25 +62,32 @@ async def query_documents(
 
 @router.get("/history", response_model=List[QueryHistory])
 async def get_query_history(
-    skip: int = 0,
-    limit: int = 20,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """Get user's query history"""
+    """Get user's query history
+    
+    Pass the previous page's X-Next-Cursor header as `before` to page through
+    the (user_id, timestamp, _id) index instead of skipping over earlier pages.
+    """
     db = get_database()
     
-    cursor = db.query_history.find(
-        {"user_id": current_user.id}
-    ).sort("timestamp", -1).skip(skip).limit(limit)
+    filters = {"user_id": current_user.id, **keyset_filter("timestamp", before)}
+    
+    cursor = db.query_history.find(filters).sort([("timestamp", -1), ("_id", -1)]).skip(skip).limit(limit)
     
     queries = await cursor.to_list(length=limit)
+    if len(queries) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(queries[-1], "timestamp")
     
-    result = []
+    # Return raw rows: response_model validates the whole list in one pydantic-core pass
     for query in queries:
         query["_id"] = str(query["_id"])
-        result.append(QueryHistory(**query))
     
-    return result
+    return queries
 
 @router.delete("/history/{query_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_query_from_history(
@@ -89,7 +97,7 @@ async def delete_query_from_history(
     """Delete a query from history"""
     db = get_database()
     
-    query = await db.query_history.find_one({"_id": query_id})
+    query = await db.query_history.find_one({"_id": query_id}, {"user_id": 1})
     
     if not query:
         raise HTTPException(
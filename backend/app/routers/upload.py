@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Response, status
 from typing import List, Optional
 import aiofiles
+import asyncio
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 
 from ..models.document import DocumentCreate, DocumentResponse, DocumentMetadata, DocumentStatus
 from ..models.user import UserInDB, UserRole
 from ..services.auth_service import AuthService
+from ..services.rag_service import invalidate_cached_document
 from ..routers.auth import get_current_user
-from ..utils.database import get_database, get_gridfs
+from ..utils.database import get_database, get_gridfs, get_audit_logs
+from ..utils.pagination import NEXT_CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, keyset_filter
 from ..config import settings
 import logging
 
@@ -17,23 +20,27 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/upload", tags=["Upload"])
 
-def validate_file(filename: str, file_size: int):
-    """Validate file type and size"""
-    # Check file extension
+# Document listings never need the OCR and table payloads
+DOCUMENT_SUMMARY_PROJECTION = {"ocr_results": 0, "tables": 0}
+
+# Size of each read from the incoming upload while streaming it into GridFS
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+def validate_file_type(filename: str):
+    """Validate file type from its extension"""
     ext = filename.rsplit('.', 1)[-1].lower()
     if ext not in settings.allowed_extensions_list:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File type .{ext} not allowed. Allowed types: {settings.ALLOWED_EXTENSIONS}"
         )
-    
-    # Check file size
-    max_size_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
-    if file_size > max_size_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size exceeds maximum of {settings.MAX_FILE_SIZE_MB}MB"
-        )
+
+def file_too_large_error() -> HTTPException:
+    """Error raised once a streamed upload exceeds the size limit"""
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File size exceeds maximum of {settings.MAX_FILE_SIZE_MB}MB"
+    )
 
 @router.post("/", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
@@ -41,79 +48,92 @@ async def upload_document(
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Upload a document for OCR processing"""
+    upload_reserved = False
     try:
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
-        
-        # Validate file
-        validate_file(file.filename, file_size)
+        # Validate file type before reading any bytes
+        validate_file_type(file.filename)
         
-        # Check user upload limit
+        # Check user upload limit; the stored count is checked and bumped in one update,
+        # since the cached user may be stale in this process
         db = get_database()
         auth_service = AuthService(db)
         
-        if current_user.role == UserRole.MEMBER:
-            if current_user.upload_count >= settings.AUTHENTICATED_UPLOAD_LIMIT:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Upload limit reached"
-                )
+        upload_limit = settings.AUTHENTICATED_UPLOAD_LIMIT if current_user.role == UserRole.MEMBER else None
+        if not await auth_service.reserve_upload(current_user.id, upload_limit):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Upload limit reached"
+            )
+        upload_reserved = True
         
-        # Store file in GridFS
+        # Stream file into GridFS chunk by chunk, enforcing the size limit as we go
         gridfs = get_gridfs()
+        now = datetime.now(timezone.utc)
+        max_size_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
         
-        file_id = await gridfs.upload_from_stream(
+        grid_in = gridfs.open_upload_stream(
             file.filename,
-            content,
             metadata={
                 "user_id": current_user.id,
                 "original_filename": file.filename,
                 "mime_type": file.content_type,
-                "upload_date": datetime.utcnow()
+                "upload_date": now
             }
         )
         
+        file_size = 0
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > max_size_bytes:
+                    raise file_too_large_error()
+                await grid_in.write(chunk)
+        except Exception:
+            await grid_in.abort()
+            raise
+        
+        await grid_in.close()
+        file_id = grid_in._id
+        
         # Create document metadata
         metadata = DocumentMetadata(
             filename=f"{uuid.uuid4()}_{file.filename}",
             original_filename=file.filename,
             file_size=file_size,
             mime_type=file.content_type or "application/octet-stream",
-            upload_date=datetime.utcnow()
+            upload_date=now
         )
         
         # Create document record
         document_data = {
             "user_id": current_user.id,
             "gridfs_id": str(file_id),
-            "metadata": metadata.dict(),
+            "metadata": metadata.model_dump(),
             "status": DocumentStatus.UPLOADED.value,
             "ocr_results": [],
             "tables": [],
             "embeddings_generated": False,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
         
         result = await db.documents.insert_one(document_data)
         document_data["_id"] = str(result.inserted_id)
         
-        # Update user upload count and storage
-        await auth_service.increment_upload_count(current_user.id)
-        await auth_service.update_storage_used(current_user.id, file_size)
-        
-        # Log to audit
-        await db.audit_logs.insert_one({
-            "user_id": current_user.id,
-            "action": "document_upload",
-            "document_id": str(result.inserted_id),
-            "timestamp": datetime.utcnow(),
-            "details": {
-                "filename": file.filename,
-                "size": file_size
-            }
-        })
+        # Update user storage, and log to audit
+        await asyncio.gather(
+            auth_service.update_storage_used(current_user.id, file_size),
+            get_audit_logs().insert_one({
+                "user_id": current_user.id,
+                "action": "document_upload",
+                "document_id": str(result.inserted_id),
+                "timestamp": now,
+                "details": {
+                    "filename": file.filename,
+                    "size": file_size
+                }
+            })
+        )
         
         logger.info(f"Document uploaded: {result.inserted_id} by user {current_user.id}")
         
@@ -127,9 +147,13 @@ async def upload_document(
         )
     
     except HTTPException as e:
+        if upload_reserved:
+            await auth_service.release_upload(current_user.id)
         raise e
     except Exception as e:
         logger.error(f"Upload error: {e}")
+        if upload_reserved:
+            await auth_service.release_upload(current_user.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Upload failed: {str(e)}"
@@ -152,25 +176,35 @@ async def guest_upload_info():
 
 @router.get("/my-documents", response_model=List[DocumentResponse])
 async def get_my_documents(
-    skip: int = 0,
-    limit: int = 20,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """Get user's uploaded documents"""
+    """Get user's uploaded documents
+    
+    Pass the previous page's X-Next-Cursor header as `before` to page through
+    the (user_id, created_at, _id) index instead of skipping over earlier pages.
+    """
     db = get_database()
     
+    filters = {"user_id": current_user.id, **keyset_filter("created_at", before)}
+    
     cursor = db.documents.find(
-        {"user_id": current_user.id}
-    ).sort("created_at", -1).skip(skip).limit(limit)
+        filters,
+        DOCUMENT_SUMMARY_PROJECTION
+    ).sort([("created_at", -1), ("_id", -1)]).skip(skip).limit(limit)
     
     documents = await cursor.to_list(length=limit)
+    if len(documents) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(documents[-1], "created_at")
     
-    result = []
+    # Return raw rows: response_model validates the whole list in one pydantic-core pass
     for doc in documents:
         doc["_id"] = str(doc["_id"])
-        result.append(DocumentResponse(**doc))
     
-    return result
+    return documents
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
@@ -180,7 +214,7 @@ async def get_document(
     """Get document by ID"""
     db = get_database()
     
-    document = await db.documents.find_one({"_id": document_id})
+    document = await db.documents.find_one({"_id": document_id}, DOCUMENT_SUMMARY_PROJECTION)
     
     if not document:
         raise HTTPException(
@@ -206,7 +240,10 @@ async def delete_document(
     """Delete a document"""
     db = get_database()
     
-    document = await db.documents.find_one({"_id": document_id})
+    document = await db.documents.find_one(
+        {"_id": document_id},
+        {"user_id": 1, "gridfs_id": 1, "metadata.file_size": 1}
+    )
     
     if not document:
         raise HTTPException(
@@ -221,32 +258,34 @@ async def delete_document(
             detail="Access denied"
         )
     
-    # Delete from GridFS
+    # Delete the file, record and embeddings, update storage and log to audit, all at once
     gridfs = get_gridfs()
-    try:
-        await gridfs.delete(document["gridfs_id"])
-    except Exception as e:
-        logger.error(f"Error deleting file from GridFS: {e}")
-    
-    # Delete document record
-    await db.documents.delete_one({"_id": document_id})
-    
-    # Delete embeddings
-    await db.embeddings.delete_many({"document_id": document_id})
-    
-    # Update user storage
     auth_service = AuthService(db)
-    await auth_service.update_storage_used(
-        current_user.id, 
-        -document["metadata"]["file_size"]
+    gridfs_result, *results = await asyncio.gather(
+        gridfs.delete(document["gridfs_id"]),
+        db.documents.delete_one({"_id": document_id}),
+        db.embeddings.delete_many({"document_id": document_id}),
+        auth_service.update_storage_used(
+            current_user.id, 
+            -document["metadata"]["file_size"]
+        ),
+        get_audit_logs().insert_one({
+            "user_id": current_user.id,
+            "action": "document_delete",
+            "document_id": document_id,
+            "timestamp": datetime.now(timezone.utc)
+        }),
+        return_exceptions=True
     )
     
-    # Log to audit
-    await db.audit_logs.insert_one({
-        "user_id": current_user.id,
-        "action": "document_delete",
-        "document_id": document_id,
-        "timestamp": datetime.utcnow()
-    })
+    # Deleted chunks must not keep being served from cached query results
+    invalidate_cached_document(document_id)
+    
+    # A missing GridFS file shouldn't block the delete; anything else should
+    if isinstance(gridfs_result, Exception):
+        logger.error(f"Error deleting file from GridFS: {gridfs_result}")
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
     
     return None
\ No newline at end of file
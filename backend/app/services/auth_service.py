@@ -1,16 +1,36 @@
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import logging
+import time
 
 from ..models.user import UserCreate, UserInDB, UserRole, Token
-from ..utils.security import get_password_hash, verify_password, create_access_token
+from ..utils.security import get_password_hash_async, verify_password_async, create_access_token
 from ..utils.database import get_database
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Process-local TTL cache of users by id; get_current_user hits it on every request.
+# Other processes only see changes once it expires, so usage limits never rely on it
+USER_CACHE_TTL = 5
+USER_CACHE_MAX_SIZE = 10_000
+
+_user_cache: Dict[str, Tuple[float, UserInDB]] = {}
+
+def _cache_user(user: UserInDB) -> UserInDB:
+    """Store a user in the cache, evicting the oldest entry when full"""
+    _user_cache.pop(user.id, None)
+    if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+        _user_cache.pop(next(iter(_user_cache)))
+    _user_cache[user.id] = (time.monotonic(), user)
+    return user
+
+def invalidate_cached_user(user_id: str):
+    """Drop a user from the cache after its document changes"""
+    _user_cache.pop(user_id, None)
+
 class AuthService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -27,10 +47,11 @@ class AuthService:
             )
         
         # Create user document
-        user_dict = user.dict()
-        user_dict["hashed_password"] = get_password_hash(user_dict.pop("password"))
-        user_dict["created_at"] = datetime.utcnow()
-        user_dict["updated_at"] = datetime.utcnow()
+        user_dict = user.model_dump()
+        user_dict["hashed_password"] = await get_password_hash_async(user_dict.pop("password"))
+        now = datetime.now(timezone.utc)
+        user_dict["created_at"] = now
+        user_dict["updated_at"] = now
         user_dict["is_active"] = True
         user_dict["upload_count"] = 0
         user_dict["query_count"] = 0
@@ -39,7 +60,7 @@ class AuthService:
         result = await self.users_collection.insert_one(user_dict)
         user_dict["_id"] = str(result.inserted_id)
         
-        return UserInDB(**user_dict)
+        return _cache_user(UserInDB(**user_dict))
     
     async def authenticate_user(self, email: str, password: str) -> Optional[UserInDB]:
         """Authenticate a user"""
@@ -47,7 +68,7 @@ class AuthService:
         if not user:
             return None
         
-        if not verify_password(password, user["hashed_password"]):
+        if not await verify_password_async(password, user["hashed_password"]):
             return None
         
         if not user.get("is_active", True):
@@ -57,14 +78,18 @@ class AuthService:
             )
         
         user["_id"] = str(user["_id"])
-        return UserInDB(**user)
+        return _cache_user(UserInDB(**user))
     
     async def get_user_by_id(self, user_id: str) -> Optional[UserInDB]:
         """Get user by ID"""
+        entry = _user_cache.get(user_id)
+        if entry and time.monotonic() - entry[0] < USER_CACHE_TTL:
+            return entry[1]
+        
         user = await self.users_collection.find_one({"_id": user_id})
         if user:
             user["_id"] = str(user["_id"])
-            return UserInDB(**user)
+            return _cache_user(UserInDB(**user))
         return None
     
     async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
@@ -98,19 +123,62 @@ class AuthService:
         """Increment user's upload count"""
         await self.users_collection.update_one(
             {"_id": user_id},
-            {"$inc": {"upload_count": 1}, "$set": {"updated_at": datetime.utcnow()}}
+            {"$inc": {"upload_count": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
         )
+        invalidate_cached_user(user_id)
     
     async def increment_query_count(self, user_id: str):
         """Increment user's query count"""
         await self.users_collection.update_one(
             {"_id": user_id},
-            {"$inc": {"query_count": 1}, "$set": {"updated_at": datetime.utcnow()}}
+            {"$inc": {"query_count": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
         )
+        invalidate_cached_user(user_id)
+    
+    async def reserve_upload(self, user_id: str, limit: Optional[int] = None) -> bool:
+        """Count an upload against the user, unless it would go past `limit`
+        
+        The limit is checked by the update itself, so it holds across processes
+        and concurrent requests regardless of the cached user.
+        """
+        return await self._reserve(user_id, "upload_count", limit)
+    
+    async def release_upload(self, user_id: str):
+        """Give back an upload reserved for a request that failed"""
+        await self._release(user_id, "upload_count")
+    
+    async def reserve_query(self, user_id: str, limit: Optional[int] = None) -> bool:
+        """Count a query against the user, unless it would go past `limit`"""
+        return await self._reserve(user_id, "query_count", limit)
+    
+    async def release_query(self, user_id: str):
+        """Give back a query reserved for a request that failed"""
+        await self._release(user_id, "query_count")
+    
+    async def _reserve(self, user_id: str, counter: str, limit: Optional[int]) -> bool:
+        """Atomically increment `counter` if it is still below `limit`"""
+        filters = {"_id": user_id}
+        if limit is not None:
+            filters[counter] = {"$lt": limit}
+        result = await self.users_collection.update_one(
+            filters,
+            {"$inc": {counter: 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+        )
+        invalidate_cached_user(user_id)
+        return result.modified_count == 1
+    
+    async def _release(self, user_id: str, counter: str):
+        """Undo a _reserve"""
+        await self.users_collection.update_one(
+            {"_id": user_id, counter: {"$gt": 0}},
+            {"$inc": {counter: -1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+        )
+        invalidate_cached_user(user_id)
     
     async def update_storage_used(self, user_id: str, size_delta: int):
         """Update user's storage usage"""
         await self.users_collection.update_one(
             {"_id": user_id},
-            {"$inc": {"storage_used": size_delta}, "$set": {"updated_at": datetime.utcnow()}}
-        )
\ No newline at end of file
+            {"$inc": {"storage_used": size_delta}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+        )
+        invalidate_cached_user(user_id)
\ No newline at end of file
@@ -1,31 +1,141 @@
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+import torch
+from bson import Binary
+from typing import List, Dict, Union
 import numpy as np
+import hashlib
 import logging
+import re
 from datetime import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import settings
+from ..utils.task_queue import get_redis
 
 logger = logging.getLogger(__name__)
 
+# Texts per forward pass when encoding a document's chunks
+EMBEDDING_BATCH_SIZE = 64
+
+# Word boundaries used for chunking, matching str.split()
+WORD_PATTERN = re.compile(r"\S+")
+
+# Content-addressed embedding cache in Redis, keyed by a hash of model + text
+EMBEDDING_CACHE_PREFIX = "emb:"
+EMBEDDING_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+def pack_embedding(embedding: Union[List[float], np.ndarray]) -> Binary:
+    """Encode an embedding as float16 bytes for storage"""
+    return Binary(np.asarray(embedding, dtype=np.float16).tobytes())
+
+def unpack_embedding(stored: Union[bytes, List[float]]) -> np.ndarray:
+    """Decode a stored embedding (float16 bytes, or a legacy list of floats) as float32"""
+    if isinstance(stored, bytes):
+        return np.frombuffer(stored, dtype=np.float16).astype(np.float32)
+    return np.asarray(stored, dtype=np.float32)
+
 class EmbeddingService:
     """Service for generating text embeddings"""
     
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         """Initialize embedding model"""
+        # torch releases the GIL while encoding, so this overlaps with other stages
+        self.executor = ThreadPoolExecutor(max_workers=1)
         try:
-            self.model = SentenceTransformer(model_name)
-            logger.info(f"Embedding model {model_name} loaded successfully")
+            device = "cuda" if settings.GPU_ENABLED and torch.cuda.is_available() else "cpu"
+            
+            # ONNX Runtime with the int8-quantized export is several times faster than
+            # PyTorch on CPU and keeps the same encode() interface; the quantized graph
+            # targets CPU kernels, so a GPU runs the regular PyTorch model instead
+            backend = settings.EMBEDDING_BACKEND if device == "cpu" else "torch"
+            model_kwargs = {}
+            if backend == "onnx":
+                model_kwargs["file_name"] = settings.EMBEDDING_ONNX_FILE
+            
+            self.cache_namespace = f"{model_name}|{backend}|{settings.EMBEDDING_DTYPE}|"
+            self.model = SentenceTransformer(
+                model_name,
+                device=device,
+                backend=backend,
+                model_kwargs=model_kwargs
+            )
+            
+            # Half-precision weights halve the bandwidth through the transformer's matmuls;
+            # encode() casts the outputs back to float32
+            dtype = getattr(torch, settings.EMBEDDING_DTYPE)
+            if backend == "torch" and dtype != torch.float32:
+                self.model.to(dtype)
+            
+            logger.info(f"Embedding model {model_name} loaded successfully ({backend} backend on {device}, {settings.EMBEDDING_DTYPE})")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise
     
+    def _cache_key(self, text: str) -> str:
+        """Cache key for the embedding of `text` under the loaded model"""
+        digest = hashlib.blake2b((self.cache_namespace + text).encode(), digest_size=16).hexdigest()
+        return EMBEDDING_CACHE_PREFIX + digest
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Run the model over `texts`, returning unit-length float32 vectors"""
+        # encode() already length-sorts the inputs to minimise padding and restores their order
+        return self.model.encode(
+            texts,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+    
+    async def _encode_cached(self, texts: List[str]) -> np.ndarray:
+        """Encode `texts`, running the model only for texts missing from the cache"""
+        redis = get_redis()
+        keys = [self._cache_key(text) for text in texts]
+        
+        cached = [None] * len(texts)
+        if redis:
+            try:
+                cached = await redis.mget(keys)
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+        
+        misses = [i for i, value in enumerate(cached) if value is None]
+        embeddings = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for i, value in enumerate(cached):
+            if value is not None:
+                embeddings[i] = np.frombuffer(value, dtype=np.float32)
+        
+        if not misses:
+            return embeddings
+        
+        loop = asyncio.get_event_loop()
+        computed = await loop.run_in_executor(
+            self.executor,
+            self._encode,
+            [texts[i] for i in misses]
+        )
+        embeddings[misses] = computed
+        
+        if redis:
+            try:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for i, vector in zip(misses, computed):
+                        pipe.set(keys[i], vector.tobytes(), ex=EMBEDDING_CACHE_TTL_SECONDS)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+        
+        return embeddings
+    
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text"""
         try:
             if not text or not text.strip():
                 return []
             
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
+            embeddings = await self._encode_cached([text])
+            return embeddings[0].tolist()
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return []
@@ -42,13 +152,13 @@ class EmbeddingService:
             if not valid_texts:
                 return []
             
-            embeddings = self.model.encode(valid_texts, convert_to_numpy=True)
+            embeddings = await self._encode_cached(valid_texts)
             return embeddings.tolist()
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}")
             return []
     
-    async def chunk_text(
+    def chunk_text(
         self, 
         text: str, 
         chunk_size: int = 500,
@@ -58,13 +168,14 @@ class EmbeddingService:
         if not text:
             return []
         
-        words = text.split()
+        # Slice each chunk straight out of the text using word offsets,
+        # rather than splitting into words and re-joining every chunk
+        spans = [match.span() for match in WORD_PATTERN.finditer(text)]
         chunks = []
         
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            if chunk:
-                chunks.append(chunk)
+        for i in range(0, len(spans), chunk_size - overlap):
+            last = min(i + chunk_size, len(spans)) - 1
+            chunks.append(text[spans[i][0]:spans[last][1]])
         
         return chunks
     
@@ -75,52 +186,65 @@ class EmbeddingService:
         chunk_size: int = 500
     ) -> List[Dict]:
         """Create embeddings for document content"""
-        embeddings_data = []
+        embeddings_data = await self.create_text_embeddings(ocr_results, chunk_size)
+        embeddings_data.extend(await self.create_table_embeddings(tables))
         
-        # Process OCR text
+        logger.info(f"Created {len(embeddings_data)} embeddings")
+        return embeddings_data
+    
+    async def create_text_embeddings(
+        self,
+        ocr_results: List,
+        chunk_size: int = 500
+    ) -> List[Dict]:
+        """Create embeddings for OCR text chunks"""
+        # Collect every chunk first so the model sees one batched encode call
+        # instead of a separate small forward pass per chunk
+        pending = []
         for ocr_result in ocr_results:
-            chunks = await self.chunk_text(ocr_result.text, chunk_size)
-            
-            for idx, chunk in enumerate(chunks):
-                embedding = await self.generate_embedding(chunk)
-                
-                if embedding:
-                    embeddings_data.append({
-                        'text': chunk,
-                        'embedding': embedding,
-                        'page_number': ocr_result.page_number,
-                        'chunk_index': idx,
-                        'source_type': 'ocr_text',
-                        'metadata': {
-                            'engine': ocr_result.engine.value,
-                            'confidence': ocr_result.confidence
-                        }
-                    })
+            chunks = self.chunk_text(ocr_result.text, chunk_size)
+            pending.extend((chunk, idx, ocr_result) for idx, chunk in enumerate(chunks))
         
-        # Process table data
-        for table in tables:
-            # Convert table to text representation
-            table_text = self._table_to_text(table)
-            
-            embedding = await self.generate_embedding(table_text)
-            
-            if embedding:
-                embeddings_data.append({
-                    'text': table_text,
-                    'embedding': embedding,
-                    'page_number': table.page_number,
-                    'chunk_index': 0,
-                    'source_type': 'table',
-                    'metadata': {
-                        'table_id': table.table_id,
-                        'rows': table.rows,
-                        'columns': table.columns,
-                        'confidence': table.confidence
-                    }
-                })
+        # Encode directly rather than through generate_embeddings_batch, which swallows
+        # errors: a failed encode must fail the document, not silently drop its chunks
+        embeddings = await self._encode_cached([chunk for chunk, _, _ in pending]) if pending else []
         
-        logger.info(f"Created {len(embeddings_data)} embeddings")
-        return embeddings_data
+        return [
+            {
+                'text': chunk,
+                'embedding': pack_embedding(embedding),
+                'page_number': ocr_result.page_number,
+                'chunk_index': idx,
+                'source_type': 'ocr_text',
+                'metadata': {
+                    'engine': ocr_result.engine.value,
+                    'confidence': ocr_result.confidence
+                }
+            }
+            for (chunk, idx, ocr_result), embedding in zip(pending, embeddings)
+        ]
+    
+    async def create_table_embeddings(self, tables: List) -> List[Dict]:
+        """Create embeddings for extracted tables"""
+        table_texts = [self._table_to_text(table) for table in tables]
+        embeddings = await self._encode_cached(table_texts) if table_texts else []
+        
+        return [
+            {
+                'text': table_text,
+                'embedding': pack_embedding(embedding),
+                'page_number': table.page_number,
+                'chunk_index': 0,
+                'source_type': 'table',
+                'metadata': {
+                    'table_id': table.table_id,
+                    'rows': table.rows,
+                    'columns': table.columns,
+                    'confidence': table.confidence
+                }
+            }
+            for table, table_text, embedding in zip(tables, table_texts, embeddings)
+        ]
     
     def _table_to_text(self, table) -> str:
         """Convert table data to text representation"""
@@ -134,18 +258,12 @@ class EmbeddingService:
     
     def cosine_similarity(
         self, 
-        embedding1: List[float], 
-        embedding2: List[float]
+        embedding1: Union[List[float], np.ndarray], 
+        embedding2: Union[List[float], np.ndarray]
     ) -> float:
         """Calculate cosine similarity between two embeddings"""
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-        
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return float(dot_product / (norm1 * norm2))
\ No newline at end of file
+        # Embeddings are L2-normalized at encode time, so the dot product is the cosine
+        return float(np.dot(
+            np.asarray(embedding1, dtype=np.float32),
+            np.asarray(embedding2, dtype=np.float32)
+        ))
\ No newline at end of file
@@ -5,8 +5,9 @@ import cv2
 import numpy as np
 from typing import List, Dict, Tuple, Optional
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
 from ..models.document import OCRResult, OCREngine
@@ -14,23 +15,36 @@ from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Pages OCR'd at once by process_document; each runs up to three engines
+OCR_PAGE_CONCURRENCY = 4
+
+# Shorter confident Tesseract reads still go to the other engines (e.g. mostly-image pages)
+OCR_CASCADE_MIN_TEXT_LENGTH = 50
+
 class OCRService:
     """Multi-engine OCR service supporting Tesseract, PaddleOCR, and EasyOCR"""
     
     def __init__(self):
-        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.executor = ThreadPoolExecutor(max_workers=OCR_PAGE_CONCURRENCY * 3)
         self.gpu_enabled = settings.GPU_ENABLED
         
-        # Initialize engines lazily
+        # Initialize engines lazily (or up front via warm_up)
         self._tesseract_initialized = True  # Always available
         self._paddle_ocr = None
         self._easy_ocr = None
+        self._init_lock = threading.Lock()
+        # Paddle and EasyOCR instances aren't safe for concurrent inference, so pages
+        # take turns on each; Tesseract runs as a subprocess and fans out freely
+        self._paddle_lock = threading.Lock()
+        self._easy_lock = threading.Lock()
         
         logger.info(f"OCR Service initialized with GPU: {self.gpu_enabled}")
     
     def _init_paddle_ocr(self):
         """Initialize PaddleOCR"""
-        if self._paddle_ocr is None:
+        with self._init_lock:
+            if self._paddle_ocr is not None:
+                return
             try:
                 self._paddle_ocr = PaddleOCR(
                     use_angle_cls=True,
@@ -44,7 +58,9 @@ class OCRService:
     
     def _init_easy_ocr(self):
         """Initialize EasyOCR"""
-        if self._easy_ocr is None:
+        with self._init_lock:
+            if self._easy_ocr is not None:
+                return
             try:
                 self._easy_ocr = easyocr.Reader(
                     ['en'],
@@ -55,13 +71,39 @@ class OCRService:
             except Exception as e:
                 logger.error(f"Failed to initialize EasyOCR: {e}")
     
+    def warm_up(self):
+        """Load the model-based engines and run each once on a blank page"""
+        self._init_paddle_ocr()
+        self._init_easy_ocr()
+        
+        # The first inference allocates buffers (and autotunes kernels on GPU)
+        blank = np.full((32, 32, 3), 255, dtype=np.uint8)
+        try:
+            if self._paddle_ocr is not None:
+                self._run_paddle_ocr(blank)
+            if self._easy_ocr is not None:
+                self._run_easy_ocr(blank)
+            logger.info("OCR engines warmed up")
+        except Exception as e:
+            logger.warning(f"OCR engine warm-up failed: {e}")
+    
+    def _run_paddle_ocr(self, image: np.ndarray):
+        """Run the shared PaddleOCR instance, one page at a time"""
+        with self._paddle_lock:
+            return self._paddle_ocr.ocr(image, cls=True)
+    
+    def _run_easy_ocr(self, image: np.ndarray):
+        """Run the shared EasyOCR reader, one page at a time"""
+        with self._easy_lock:
+            return self._easy_ocr.readtext(image)
+    
     async def extract_text_tesseract(
         self, 
         image: np.ndarray, 
         page_number: int
     ) -> OCRResult:
         """Extract text using Tesseract"""
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
         
         try:
             # Run Tesseract in thread pool
@@ -91,7 +133,7 @@ class OCRService:
             full_text = ' '.join(texts)
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
             
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
             
             return OCRResult(
                 engine=OCREngine.TESSERACT,
@@ -107,7 +149,7 @@ class OCRService:
                 engine=OCREngine.TESSERACT,
                 text="",
                 confidence=0.0,
-                processing_time=(datetime.utcnow() - start_time).total_seconds(),
+                processing_time=(datetime.now(timezone.utc) - start_time).total_seconds(),
                 page_number=page_number
             )
     
@@ -117,7 +159,7 @@ class OCRService:
         page_number: int
     ) -> OCRResult:
         """Extract text using PaddleOCR"""
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
         
         try:
             self._init_paddle_ocr()
@@ -127,7 +169,8 @@ class OCRService:
             loop = asyncio.get_event_loop()
             result = await loop.run_in_executor(
                 self.executor,
-                lambda: self._paddle_ocr.ocr(image, cls=True)
+                self._run_paddle_ocr,
+                image
             )
             
             texts = []
@@ -144,7 +187,7 @@ class OCRService:
             full_text = ' '.join(texts)
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
             
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
             
             return OCRResult(
                 engine=OCREngine.PADDLEOCR,
@@ -160,7 +203,7 @@ class OCRService:
                 engine=OCREngine.PADDLEOCR,
                 text="",
                 confidence=0.0,
-                processing_time=(datetime.utcnow() - start_time).total_seconds(),
+                processing_time=(datetime.now(timezone.utc) - start_time).total_seconds(),
                 page_number=page_number
             )
     
@@ -170,7 +213,7 @@ class OCRService:
         page_number: int
     ) -> OCRResult:
         """Extract text using EasyOCR"""
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
         
         try:
             self._init_easy_ocr()
@@ -180,7 +223,8 @@ class OCRService:
             loop = asyncio.get_event_loop()
             result = await loop.run_in_executor(
                 self.executor,
-                lambda: self._easy_ocr.readtext(image)
+                self._run_easy_ocr,
+                image
             )
             
             texts = []
@@ -195,7 +239,7 @@ class OCRService:
             full_text = ' '.join(texts)
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
             
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
             
             return OCRResult(
                 engine=OCREngine.EASYOCR,
@@ -211,7 +255,7 @@ class OCRService:
                 engine=OCREngine.EASYOCR,
                 text="",
                 confidence=0.0,
-                processing_time=(datetime.utcnow() - start_time).total_seconds(),
+                processing_time=(datetime.now(timezone.utc) - start_time).total_seconds(),
                 page_number=page_number
             )
     
@@ -225,6 +269,17 @@ class OCRService:
         if engines is None:
             engines = [OCREngine.TESSERACT, OCREngine.PADDLEOCR, OCREngine.EASYOCR]
         
+        # Cascade: a confident Tesseract read of a clean page makes the heavier engines redundant
+        cascade_result = None
+        if OCREngine.TESSERACT in engines and len(engines) > 1:
+            cascade_result = await self.extract_text_tesseract(image, page_number)
+            if (
+                cascade_result.confidence >= settings.OCR_CASCADE_CONFIDENCE
+                and len(cascade_result.text) > OCR_CASCADE_MIN_TEXT_LENGTH
+            ):
+                return [cascade_result]
+            engines = [engine for engine in engines if engine != OCREngine.TESSERACT]
+        
         tasks = []
         
         for engine in engines:
@@ -239,6 +294,8 @@ class OCRService:
         
         # Filter out exceptions
         valid_results = [r for r in results if isinstance(r, OCRResult)]
+        if cascade_result is not None:
+            valid_results.insert(0, cascade_result)
         
         return valid_results
     
@@ -268,18 +325,21 @@ class OCRService:
         use_multi_engine: bool = True
     ) -> List[OCRResult]:
         """Process entire document with OCR"""
-        all_results = []
+        # Pages overlap their engine calls; the semaphore bounds images in flight
+        semaphore = asyncio.Semaphore(OCR_PAGE_CONCURRENCY)
         
-        for page_num, image in enumerate(images, start=1):
-            logger.info(f"Processing page {page_num}/{len(images)}")
-            
-            if use_multi_engine:
-                page_results = await self.extract_text_multi_engine(image, page_num)
-                best_result = self.select_best_result(page_results)
-                if best_result:
-                    all_results.append(best_result)
-            else:
-                result = await self.extract_text_tesseract(image, page_num)
-                all_results.append(result)
+        async def process_page(page_num: int, image: np.ndarray) -> Optional[OCRResult]:
+            async with semaphore:
+                logger.info(f"Processing page {page_num}/{len(images)}")
+                
+                if use_multi_engine:
+                    page_results = await self.extract_text_multi_engine(image, page_num)
+                    return self.select_best_result(page_results)
+                return await self.extract_text_tesseract(image, page_num)
+        
+        results = await asyncio.gather(*(
+            process_page(page_num, image)
+            for page_num, image in enumerate(images, start=1)
+        ))
         
-        return all_results
\ No newline at end of file
+        return [result for result in results if result]
\ No newline at end of file
@@ -1,15 +1,68 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+import faiss
 import openai
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 from ..models.query import QueryRequest, QueryResponse, Citation
 from ..config import settings
 from .embedding_service import EmbeddingService
+from .vector_index import vector_index
 
 logger = logging.getLogger(__name__)
 
+# Process-local semantic cache of retrieval results; near-duplicate queries
+# (cosine above the threshold, same documents and top_k) reuse earlier chunks
+QUERY_CACHE_TTL = 300
+QUERY_CACHE_MAX_SIZE = 1000
+QUERY_CACHE_MIN_SIMILARITY = 0.95
+QUERY_CACHE_CANDIDATES = 8
+
+# Rows of the index line up with the (cached_at, scope, chunks) entries
+_query_index: Optional[faiss.IndexFlatIP] = None
+_query_cache_entries: List[Tuple[float, Tuple, List[Dict]]] = []
+
+def _get_cached_chunks(query_vector: np.ndarray, scope: Tuple) -> Optional[List[Dict]]:
+    """Return chunks cached for a near-identical query with the same scope"""
+    if _query_index is None or _query_index.ntotal == 0:
+        return None
+    
+    scores, rows = _query_index.search(query_vector[None], min(QUERY_CACHE_CANDIDATES, _query_index.ntotal))
+    now = time.monotonic()
+    for score, row in zip(scores[0], rows[0]):
+        if score < QUERY_CACHE_MIN_SIMILARITY:
+            break
+        cached_at, cached_scope, chunks = _query_cache_entries[row]
+        if cached_scope == scope and now - cached_at < QUERY_CACHE_TTL:
+            return chunks
+    return None
+
+def _cache_chunks(query_vector: np.ndarray, scope: Tuple, chunks: List[Dict]):
+    """Store retrieval results for a query, evicting the oldest entry when full"""
+    global _query_index
+    if _query_index is None:
+        _query_index = faiss.IndexFlatIP(len(query_vector))
+    if _query_index.ntotal >= QUERY_CACHE_MAX_SIZE:
+        _query_index.remove_ids(np.zeros(1, dtype=np.int64))
+        _query_cache_entries.pop(0)
+    _query_index.add(query_vector[None])
+    _query_cache_entries.append((time.monotonic(), scope, chunks))
+
+def invalidate_cached_document(document_id: str):
+    """Drop cached results that cite a document, e.g. after it is deleted"""
+    stale = [
+        row for row, (_, _, chunks) in enumerate(_query_cache_entries)
+        if any(chunk.get('document_id') == document_id for chunk in chunks)
+    ]
+    if stale:
+        # Removing rows from a flat index keeps the survivors in order, like the list
+        _query_index.remove_ids(np.asarray(stale, dtype=np.int64))
+        for row in reversed(stale):
+            _query_cache_entries.pop(row)
+
 class RAGService:
     """Retrieval-Augmented Generation service"""
     
@@ -32,33 +85,33 @@ class RAGService:
         if not query_embedding:
             return []
         
-        # Build query filter
-        filter_query = {}
-        if document_ids:
-            filter_query['document_id'] = {'$in': document_ids}
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        scope = (tuple(sorted(document_ids)) if document_ids else None, top_k)
+        # Deletions made through other processes reach this one via the index refresh
+        await vector_index.refresh(self.db)
+        cached_chunks = _get_cached_chunks(query_vector, scope)
+        if cached_chunks is not None:
+            return [
+                chunk for chunk in cached_chunks
+                if chunk.get('document_id') in vector_index.document_labels
+            ]
         
-        # Retrieve all embeddings (in production, use vector search)
-        cursor = self.embeddings_collection.find(filter_query)
-        all_embeddings = await cursor.to_list(length=1000)
+        # Rank in the in-process FAISS index, then fetch only the winning chunks
+        hits = vector_index.search(query_vector, top_k, document_ids)
         
-        # Calculate similarities
-        similarities = []
-        for emb_doc in all_embeddings:
-            similarity = self.embedding_service.cosine_similarity(
-                query_embedding,
-                emb_doc['embedding']
-            )
-            
-            similarities.append({
-                'similarity': similarity,
-                'document': emb_doc
-            })
+        if not hits:
+            return []
         
-        # Sort by similarity and get top K
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        top_results = similarities[:top_k]
+        cursor = self.embeddings_collection.find(
+            {'_id': {'$in': [chunk_id for chunk_id, _ in hits]}},
+            {'embedding': 0}
+        )
+        chunks_by_id = {chunk['_id']: chunk async for chunk in cursor}
         
-        return [result['document'] for result in top_results]
+        # Chunks deleted since the last index refresh are simply skipped
+        chunks = [chunks_by_id[chunk_id] for chunk_id, _ in hits if chunk_id in chunks_by_id]
+        _cache_chunks(query_vector, scope, chunks)
+        return chunks
     
     async def generate_answer(
         self,
@@ -120,7 +173,7 @@ Answer:"""
         user_id: str
     ) -> QueryResponse:
         """Process a complete RAG query"""
-        start_time = datetime.utcnow()
+        start_time = datetime.now(timezone.utc)
         
         try:
             # Retrieve relevant chunks
@@ -148,7 +201,7 @@ Answer:"""
             # Calculate overall confidence
             avg_confidence = sum(c.confidence for c in citations) / len(citations) if citations else 0.0
             
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = (datetime.now(timezone.utc) - start_time).total_seconds()
             
             response = QueryResponse(
                 query=query_request.query,
@@ -170,7 +223,7 @@ Answer:"""
                 answer="An error occurred while processing your query. Please try again.",
                 citations=[],
                 confidence=0.0,
-                processing_time=(datetime.utcnow() - start_time).total_seconds()
+                processing_time=(datetime.now(timezone.utc) - start_time).total_seconds()
             )
     
     async def _save_query_history(self, user_id: str, response: QueryResponse):
@@ -180,9 +233,9 @@ Answer:"""
                 'user_id': user_id,
                 'query': response.query,
                 'answer': response.answer,
-                'citations': [c.dict() for c in response.citations],
+                'citations': [c.model_dump() for c in response.citations],
                 'confidence': response.confidence,
-                'timestamp': datetime.utcnow()
+                'timestamp': datetime.now(timezone.utc)
             }
             
             await self.db.query_history.insert_one(query_doc)
@@ -1,20 +1,48 @@
 import cv2
 import numpy as np
+from tesserocr import PyTessBaseAPI, PSM, RIL, iterate_level
+from PIL import Image
 from typing import List, Dict, Tuple, Optional
 import logging
 from datetime import datetime
 import uuid
+from itertools import chain
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ..models.document import TableData
+from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Ruling lines are found at reduced resolution; boxes and cells are scaled back up
+DETECTION_SCALE = 2
+LINE_LENGTH = 40  # Minimum ruling-line length in full-resolution pixels
+
+# Window of the local-mean threshold that separates ink from paper
+THRESHOLD_BLOCK_SIZE = 11
+
+# Columns of the (N, 6) cell arrays produced by _detect_cells
+CELL_X, CELL_Y, CELL_WIDTH, CELL_HEIGHT, CELL_CENTER_X, CELL_CENTER_Y = range(6)
+
 class TableDetectionService:
     """Service for detecting and extracting tables from documents"""
     
     def __init__(self):
         self.min_table_area = 10000  # Minimum area for table detection
         self.confidence_threshold = 0.7
+        # OpenCV and Tesseract release the GIL, so pages run across cores
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        # One in-process Tesseract per executor thread; the API object isn't reentrant
+        self._tesseract = threading.local()
+        # Page-level line masks run through OpenCV's CUDA module when it was built with one
+        self.use_gpu = settings.GPU_ENABLED and cv2.cuda.getCudaEnabledDeviceCount() > 0
+        # CUDA filters hold device buffers and aren't shared between streams, so each thread keeps its own
+        self._gpu_filters = threading.local()
+        
+        logger.info(f"Table Detection Service initialized with GPU: {self.use_gpu}")
     
     async def detect_tables(
         self, 
@@ -22,65 +50,157 @@ class TableDetectionService:
         page_number: int
     ) -> List[Dict]:
         """Detect tables in an image using contour detection"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.detect_tables_sync, image, page_number)
+    
+    def detect_tables_sync(
+        self, 
+        image: np.ndarray, 
+        page_number: int
+    ) -> List[Dict]:
+        """Detect tables in an image using contour detection (blocking)"""
+        tables, _ = self._detect_tables_with_mask(image, page_number)
+        return tables
+    
+    def _detect_tables_with_mask(
+        self, 
+        image: np.ndarray, 
+        page_number: int
+    ) -> Tuple[List[Dict], Optional[np.ndarray]]:
+        """Detect tables, also returning the ruling-line mask they were found in"""
         try:
             # Convert to grayscale
             if len(image.shape) == 3:
                 gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
             else:
-                gray = image.copy()
+                gray = image
             
-            # Threshold
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY_INV, 
-                11, 2
-            )
-            
-            # Detect horizontal and vertical lines
-            horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-            vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
+            # Table lines don't need full resolution; a strided view quarters the pixels
+            small = np.ascontiguousarray(gray[::DETECTION_SCALE, ::DETECTION_SCALE])
+            if self.use_gpu:
+                table_mask = self._line_mask_gpu(small, LINE_LENGTH // DETECTION_SCALE)
+            else:
+                table_mask = self._line_mask(small, LINE_LENGTH // DETECTION_SCALE)
             
-            horizontal_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel)
-            vertical_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel)
+            # Label each connected line structure once; its bounding box comes back in the stats
+            _, _, stats, _ = cv2.connectedComponentsWithStats(table_mask, connectivity=8, ltype=cv2.CV_32S)
+            stats = stats[1:] * DETECTION_SCALE  # Drop the background label
             
-            # Combine lines
-            table_mask = cv2.add(horizontal_lines, vertical_lines)
+            widths = stats[:, cv2.CC_STAT_WIDTH]
+            heights = stats[:, cv2.CC_STAT_HEIGHT]
+            # A grid's enclosed area is its bounding box, not its (thin) line pixel count
+            areas = widths * heights
+            aspect_ratios = widths / heights
             
-            # Find contours
-            contours, _ = cv2.findContours(
-                table_mask, 
-                cv2.RETR_EXTERNAL, 
-                cv2.CONTOUR_APPROX_SIMPLE
-            )
+            # Basic validation: large enough, with reasonable table proportions
+            keep = (areas > self.min_table_area) & (aspect_ratios > 0.2) & (aspect_ratios < 5)
             
-            tables = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                
-                if area > self.min_table_area:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
-                    # Basic validation
-                    aspect_ratio = w / h
-                    if 0.2 < aspect_ratio < 5:  # Reasonable table proportions
-                        tables.append({
-                            'page_number': page_number,
-                            'bounding_box': {
-                                'x': int(x),
-                                'y': int(y),
-                                'width': int(w),
-                                'height': int(h)
-                            },
-                            'area': area
-                        })
+            tables = [
+                {
+                    'page_number': page_number,
+                    'bounding_box': {
+                        'x': int(x),
+                        'y': int(y),
+                        'width': int(w),
+                        'height': int(h)
+                    },
+                    'area': float(area)
+                }
+                for (x, y, w, h), area in zip(
+                    stats[keep][:, :cv2.CC_STAT_AREA].tolist(),
+                    areas[keep].tolist()
+                )
+            ]
             
             logger.info(f"Detected {len(tables)} tables on page {page_number}")
-            return tables
+            return tables, table_mask
         
         except Exception as e:
             logger.error(f"Error detecting tables: {e}")
-            return []
+            return [], None
+    
+    def _line_mask(self, gray: np.ndarray, line_length: int = LINE_LENGTH) -> np.ndarray:
+        """Binary mask of the horizontal and vertical ruling lines in a grayscale image"""
+        # Threshold against the local mean: a box filter costs the same per pixel whatever
+        # the window, and ruling lines don't need Gaussian weighting to stand out
+        thresh = cv2.adaptiveThreshold(
+            gray, 255, 
+            cv2.ADAPTIVE_THRESH_MEAN_C, 
+            cv2.THRESH_BINARY_INV, 
+            THRESHOLD_BLOCK_SIZE, 2
+        )
+        
+        # Detect horizontal and vertical lines
+        horizontal_lines = self._open_line(thresh, (line_length, 1))
+        vertical_lines = self._open_line(thresh, (1, line_length))
+        
+        # Combine lines
+        return cv2.bitwise_or(horizontal_lines, vertical_lines, dst=horizontal_lines)
+    
+    def _line_mask_gpu(self, gray: np.ndarray, line_length: int = LINE_LENGTH) -> np.ndarray:
+        """_line_mask on the GPU; only the finished mask is downloaded"""
+        # Each executor thread queues its page on its own stream so uploads overlap with other pages
+        stream = cv2.cuda_Stream()
+        src = cv2.cuda_GpuMat()
+        src.upload(gray, stream=stream)
+        
+        box_filter, horizontal_open, vertical_open = self._gpu_line_filters(line_length)
+        
+        # Adaptive mean threshold: foreground where the pixel is at least 2 below its local mean.
+        # src + 2 is formed in 16 bits so white (255) doesn't saturate into the mean it's compared to
+        blur = box_filter.apply(src, stream=stream).convertTo(rtype=cv2.CV_16SC1, stream=stream)
+        shifted = src.convertTo(rtype=cv2.CV_16SC1, alpha=1.0, beta=2.0, stream=stream)
+        thresh = cv2.cuda.compare(shifted, blur, cv2.CMP_LE, stream=stream)
+        
+        # Detect horizontal and vertical lines
+        horizontal_lines = horizontal_open.apply(thresh, stream=stream)
+        vertical_lines = vertical_open.apply(thresh, stream=stream)
+        
+        # Combine lines
+        mask = cv2.cuda.bitwise_or(horizontal_lines, vertical_lines, stream=stream).download(stream=stream)
+        stream.waitForCompletion()
+        return mask
+    
+    def _gpu_line_filters(self, line_length: int) -> Tuple:
+        """This thread's (threshold box filter, horizontal open, vertical open), built once per line length"""
+        filters = getattr(self._gpu_filters, 'by_length', None)
+        if filters is None:
+            filters = self._gpu_filters.by_length = {}
+        if line_length not in filters:
+            filters[line_length] = (
+                cv2.cuda.createBoxFilter(
+                    cv2.CV_8UC1, cv2.CV_8UC1,
+                    (THRESHOLD_BLOCK_SIZE, THRESHOLD_BLOCK_SIZE),
+                    borderMode=cv2.BORDER_REPLICATE
+                ),
+                *(
+                    cv2.cuda.createMorphologyFilter(
+                        cv2.MORPH_OPEN, cv2.CV_8UC1, cv2.getStructuringElement(cv2.MORPH_RECT, ksize)
+                    )
+                    for ksize in ((line_length, 1), (1, line_length))
+                )
+            )
+        return filters[line_length]
+    
+    def _open_line(self, mask: np.ndarray, ksize: Tuple[int, int]) -> np.ndarray:
+        """Morphological open of a binary mask with a 1-D line of size `ksize` (width, height)
+        
+        Same result as cv2.morphologyEx(MORPH_OPEN) with a MORPH_RECT kernel, but erosion and
+        dilation are running-sum box filters, so the cost per pixel doesn't grow with the line length.
+        """
+        # Erode: a pixel survives when no background falls in its window (outside the image
+        # counts as foreground, as in OpenCV's erode)
+        background = cv2.compare(mask, 0, cv2.CMP_EQ)
+        background_count = cv2.boxFilter(
+            background, cv2.CV_16U, ksize, normalize=False, borderType=cv2.BORDER_CONSTANT
+        )
+        eroded = cv2.compare(background_count, 0, cv2.CMP_EQ)
+        
+        # Dilate: a pixel is set when any eroded pixel falls in its window
+        eroded_count = cv2.boxFilter(
+            eroded, cv2.CV_16U, ksize, normalize=False, borderType=cv2.BORDER_CONSTANT
+        )
+        return cv2.compare(eroded_count, 0, cv2.CMP_GT)
     
     async def extract_table_data(
         self, 
@@ -90,6 +210,20 @@ class TableDetectionService:
         ocr_text: str = ""
     ) -> TableData:
         """Extract data from detected table"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, self.extract_table_data_sync, image, table_bbox, page_number, ocr_text
+        )
+    
+    def extract_table_data_sync(
+        self, 
+        image: np.ndarray, 
+        table_bbox: Dict,
+        page_number: int,
+        ocr_text: str = "",
+        table_mask: Optional[np.ndarray] = None
+    ) -> TableData:
+        """Extract data from detected table (blocking)"""
         try:
             x = table_bbox['x']
             y = table_bbox['y']
@@ -99,8 +233,19 @@ class TableDetectionService:
             # Crop table region
             table_img = image[y:y+h, x:x+w]
             
-            # Detect cells within table
-            cells = await self._detect_cells(table_img)
+            # Detect cells within table, reusing the page's line mask when detection provided it
+            if table_mask is not None:
+                # The mask is at detection scale; box coordinates are multiples of it
+                cells = self._detect_cells(
+                    table_img,
+                    table_mask[
+                        y // DETECTION_SCALE:(y + h) // DETECTION_SCALE,
+                        x // DETECTION_SCALE:(x + w) // DETECTION_SCALE
+                    ],
+                    DETECTION_SCALE
+                )
+            else:
+                cells = self._detect_cells(table_img)
             
             # Organize cells into rows and columns
             structured_data = self._organize_cells(cells, table_img)
@@ -137,97 +282,114 @@ class TableDetectionService:
                 extraction_method="failed"
             )
     
-    async def _detect_cells(self, table_img: np.ndarray) -> List[Dict]:
-        """Detect individual cells within a table"""
-        gray = cv2.cvtColor(table_img, cv2.COLOR_RGB2GRAY) if len(table_img.shape) == 3 else table_img
-        
-        thresh = cv2.adaptiveThreshold(
-            gray, 255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV,
-            11, 2
-        )
+    def _detect_cells(
+        self,
+        table_img: np.ndarray,
+        cell_mask: Optional[np.ndarray] = None,
+        scale: int = 1
+    ) -> np.ndarray:
+        """Detect individual cells within a table, from a line mask `scale` times smaller than the crop"""
+        if cell_mask is None:
+            gray = cv2.cvtColor(table_img, cv2.COLOR_RGB2GRAY) if len(table_img.shape) == 3 else table_img
+            cell_mask = self._line_mask(gray)
         
-        # Find cell contours
+        # Cells are the regions enclosed by the ruling lines, so trace the line mask
+        # rather than every glyph in a fresh threshold of the crop
         contours, _ = cv2.findContours(
-            thresh,
+            cell_mask,
             cv2.RETR_TREE,
-            cv2.CONTOUR_APPROX_SIMPLE
+            cv2.CHAIN_APPROX_SIMPLE
         )
         
-        cells = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Minimum cell size
-                x, y, w, h = cv2.boundingRect(contour)
-                cells.append({
-                    'x': x,
-                    'y': y,
-                    'width': w,
-                    'height': h,
-                    'center_x': x + w // 2,
-                    'center_y': y + h // 2
-                })
-        
+        # Measure every contour, then filter and build the cell rows as whole arrays
+        min_area = 100 / scale ** 2  # Minimum cell size
+        rects = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.int32).reshape(-1, 4)
+
+        # A contour never encloses more than its bounding box, so small boxes (line fragments,
+        # specks) are rejected before paying for the polygon area
+        candidates = np.flatnonzero(rects[:, 2] * rects[:, 3] > min_area)
+        areas = np.fromiter((cv2.contourArea(contours[i]) for i in candidates), dtype=np.float64, count=len(candidates))
+        rects = rects[candidates[areas > min_area]] * scale
+
+        cells = np.empty((len(rects), 6), dtype=np.int32)
+        cells[:, :4] = rects
+        cells[:, CELL_CENTER_X] = rects[:, 0] + rects[:, 2] // 2
+        cells[:, CELL_CENTER_Y] = rects[:, 1] + rects[:, 3] // 2
         return cells
     
     def _organize_cells(
         self, 
-        cells: List[Dict], 
+        cells: np.ndarray, 
         table_img: np.ndarray
     ) -> List[List[str]]:
         """Organize detected cells into rows and columns"""
-        if not cells:
+        if len(cells) == 0:
             return []
         
         # Sort cells by Y position (rows) then X position (columns)
-        sorted_cells = sorted(cells, key=lambda c: (c['center_y'], c['center_x']))
+        sorted_cells = cells[np.lexsort((cells[:, CELL_CENTER_X], cells[:, CELL_CENTER_Y]))]
         
-        # Group into rows based on Y proximity
-        rows = []
-        current_row = []
-        last_y = sorted_cells[0]['center_y']
+        # Start a new row wherever consecutive centers are a row's height apart
         y_threshold = 20  # Pixels tolerance for same row
+        breaks = np.flatnonzero(np.diff(sorted_cells[:, CELL_CENTER_Y]) >= y_threshold) + 1
+        rows = [
+            row[np.argsort(row[:, CELL_CENTER_X], kind='stable')]
+            for row in np.split(sorted_cells, breaks)
+        ]
         
-        for cell in sorted_cells:
-            if abs(cell['center_y'] - last_y) < y_threshold:
-                current_row.append(cell)
-            else:
-                if current_row:
-                    rows.append(sorted(current_row, key=lambda c: c['center_x']))
-                current_row = [cell]
-                last_y = cell['center_y']
+        # OCR the whole table once and assign each word to the cells containing its center,
+        # instead of launching Tesseract separately for every cell
+        texts = []
+        centers = []
+        try:
+            api = self._tesseract_api()
+            api.SetImage(Image.fromarray(table_img))
+            api.Recognize()
+            iterator = api.GetIterator()
+            for word in iterate_level(iterator, RIL.WORD) if iterator else ():
+                text = (word.GetUTF8Text(RIL.WORD) or '').strip()
+                box = word.BoundingBox(RIL.WORD)
+                if text and box:
+                    x1, y1, x2, y2 = box
+                    texts.append(text)
+                    centers.append(((x1 + x2) // 2, (y1 + y2) // 2))
+        except Exception as e:
+            logger.error(f"Error reading table text: {e}")
+            texts = []
+            centers = []
         
-        if current_row:
-            rows.append(sorted(current_row, key=lambda c: c['center_x']))
+        texts = np.array(texts, dtype=object)
+        centers = np.array(centers, dtype=np.int32).reshape(-1, 2)
+        word_x = centers[:, 0]
+        word_y = centers[:, 1]
         
-        # Extract text from cells using simple OCR
         structured_data = []
         for row in rows:
-            row_data = []
-            for cell in row:
-                try:
-                    x, y, w, h = cell['x'], cell['y'], cell['width'], cell['height']
-                    cell_img = table_img[y:y+h, x:x+w]
-                    
-                    # Simple OCR or placeholder
-                    import pytesseract
-                    text = pytesseract.image_to_string(cell_img, config='--psm 7').strip()
-                    row_data.append(text if text else "")
-                except:
-                    row_data.append("")
-            
-            structured_data.append(row_data)
+            # (cells in row, words) containment matrix in one broadcast
+            left = row[:, CELL_X, None]
+            top = row[:, CELL_Y, None]
+            inside = (
+                (left <= word_x) & (word_x < left + row[:, CELL_WIDTH, None])
+                & (top <= word_y) & (word_y < top + row[:, CELL_HEIGHT, None])
+            )
+            structured_data.append([' '.join(texts[cell_words]) for cell_words in inside])
         
         return structured_data
     
+    def _tesseract_api(self) -> PyTessBaseAPI:
+        """This thread's Tesseract instance, created on first use so the model loads only once"""
+        api = getattr(self._tesseract, 'api', None)
+        if api is None:
+            api = self._tesseract.api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+        return api
+    
     def _calculate_table_confidence(
         self, 
-        cells: List[Dict], 
+        cells: np.ndarray, 
         structured_data: List[List[str]]
     ) -> float:
         """Calculate confidence score for table extraction"""
-        if not structured_data or not cells:
+        if not structured_data or len(cells) == 0:
             return 0.0
         
         # Factors for confidence:
@@ -237,16 +399,12 @@ class TableDetectionService:
         
         cell_score = min(len(cells) / 50.0, 1.0)  # Normalize to max 50 cells
         
-        # Check row consistency
-        row_lengths = [len(row) for row in structured_data]
-        if row_lengths:
-            avg_length = sum(row_lengths) / len(row_lengths)
-            consistency = 1.0 - (np.std(row_lengths) / (avg_length + 1))
-        else:
-            consistency = 0.0
+        # Check row consistency (structured_data is non-empty here)
+        row_lengths = np.fromiter(map(len, structured_data), dtype=np.int32, count=len(structured_data))
+        consistency = 1.0 - float(row_lengths.std()) / (float(row_lengths.mean()) + 1)
         
         # Text extraction score
-        total_chars = sum(len(cell) for row in structured_data for cell in row)
+        total_chars = sum(map(len, chain.from_iterable(structured_data)))
         text_score = min(total_chars / 500.0, 1.0)
         
         confidence = (cell_score * 0.3 + consistency * 0.4 + text_score * 0.3)
@@ -259,27 +417,36 @@ class TableDetectionService:
         ocr_results: List = None
     ) -> List[TableData]:
         """Process all tables in a document"""
-        all_tables = []
+        page_text = {}
+        for result in ocr_results or []:
+            page_text.setdefault(result.page_number, result.text)
         
-        for page_num, image in enumerate(images, start=1):
-            # Detect tables
-            detected_tables = await self.detect_tables(image, page_num)
-            
-            # Extract data from each table
-            for table_bbox in detected_tables:
-                ocr_text = ""
-                if ocr_results:
-                    page_ocr = [r for r in ocr_results if r.page_number == page_num]
-                    ocr_text = page_ocr[0].text if page_ocr else ""
-                
-                table_data = await self.extract_table_data(
-                    image,
-                    table_bbox['bounding_box'],
-                    page_num,
-                    ocr_text
-                )
-                
-                all_tables.append(table_data)
+        # Pages are independent, so detect and extract each one on its own thread
+        loop = asyncio.get_event_loop()
+        page_tables = await asyncio.gather(*(
+            loop.run_in_executor(
+                self.executor,
+                self._process_page_tables_sync,
+                image,
+                page_num,
+                page_text.get(page_num, "")
+            )
+            for page_num, image in enumerate(images, start=1)
+        ))
+        all_tables = [table for tables in page_tables for table in tables]
         
         logger.info(f"Extracted {len(all_tables)} tables from document")
-        return all_tables
\ No newline at end of file
+        return all_tables
+    
+    def _process_page_tables_sync(
+        self,
+        image: np.ndarray,
+        page_number: int,
+        ocr_text: str
+    ) -> List[TableData]:
+        """Detect and extract every table on one page (blocking)"""
+        tables, table_mask = self._detect_tables_with_mask(image, page_number)
+        return [
+            self.extract_table_data_sync(image, table_bbox['bounding_box'], page_number, ocr_text, table_mask)
+            for table_bbox in tables
+        ]
\ No newline at end of file
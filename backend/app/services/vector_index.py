@@ -0,0 +1,131 @@
+import faiss
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from .embedding_service import unpack_embedding
+
+logger = logging.getLogger(__name__)
+
+# How often the index re-checks which documents have finished embedding
+INDEX_REFRESH_INTERVAL = 5
+
+# How long a document that came back with no embeddings is re-fetched before it's
+# taken as genuinely empty (its rows may not have been visible yet)
+EMPTY_DOCUMENT_RETRY_SECONDS = 60
+
+class VectorIndex:
+    """Process-local FAISS inner-product index over stored chunk embeddings"""
+
+    def __init__(self):
+        self.index: Optional[faiss.IndexIDMap2] = None
+        self.next_label = 0
+        # FAISS label -> embeddings _id, and document id -> its labels
+        self.chunk_ids: Dict[int, object] = {}
+        self.document_labels: Dict[str, np.ndarray] = {}
+        # Embedded documents that have returned no rows so far, and when that was first seen
+        self.empty_since: Dict[str, float] = {}
+        self.refreshed_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, db: AsyncIOMotorDatabase):
+        """Add newly embedded documents and drop deleted ones"""
+        if time.monotonic() - self.refreshed_at < INDEX_REFRESH_INTERVAL:
+            return
+
+        async with self.lock:
+            if time.monotonic() - self.refreshed_at < INDEX_REFRESH_INTERVAL:
+                return
+
+            # A document is only marked embedded once all of its chunks are written
+            cursor = db.documents.find({"embeddings_generated": True}, {"_id": 1})
+            ready = {str(doc["_id"]) async for doc in cursor}
+
+            for document_id in self.document_labels.keys() - ready:
+                self._remove_document(document_id)
+            for document_id in self.empty_since.keys() - ready:
+                del self.empty_since[document_id]
+
+            new_documents = list(ready - self.document_labels.keys())
+            if new_documents:
+                cursor = db.embeddings.find(
+                    {"document_id": {"$in": new_documents}},
+                    {"embedding": 1, "document_id": 1}
+                )
+                self._add_chunks(await cursor.to_list(length=None))
+                
+                # Empty documents are retried for a while, then recorded as loaded so
+                # they stop being re-queried on every refresh
+                now = time.monotonic()
+                for document_id in new_documents:
+                    if document_id in self.document_labels:
+                        self.empty_since.pop(document_id, None)
+                    elif now - self.empty_since.setdefault(document_id, now) >= EMPTY_DOCUMENT_RETRY_SECONDS:
+                        self.document_labels[document_id] = np.empty(0, dtype=np.int64)
+                        del self.empty_since[document_id]
+
+            self.refreshed_at = time.monotonic()
+
+    def _add_chunks(self, chunks: List[Dict]):
+        """Index embedding rows, skipping any that don't match the index dimension"""
+        if not chunks:
+            return
+
+        vectors = [unpack_embedding(chunk["embedding"]) for chunk in chunks]
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vectors[0])))
+        keep = [i for i, vector in enumerate(vectors) if len(vector) == self.index.d]
+        if not keep:
+            return
+        chunks = [chunks[i] for i in keep]
+
+        labels = np.arange(self.next_label, self.next_label + len(chunks), dtype=np.int64)
+        self.next_label += len(chunks)
+        self.index.add_with_ids(np.vstack([vectors[i] for i in keep]), labels)
+
+        by_document: Dict[str, List[int]] = {}
+        for label, chunk in zip(labels.tolist(), chunks):
+            self.chunk_ids[label] = chunk["_id"]
+            by_document.setdefault(chunk["document_id"], []).append(label)
+        for document_id, document_labels in by_document.items():
+            self.document_labels[document_id] = np.asarray(document_labels, dtype=np.int64)
+
+    def _remove_document(self, document_id: str):
+        """Drop a document's chunks from the index"""
+        labels = self.document_labels.pop(document_id)
+        if len(labels):
+            self.index.remove_ids(labels)
+            for label in labels.tolist():
+                self.chunk_ids.pop(label, None)
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        top_k: int,
+        document_ids: Optional[List[str]] = None
+    ) -> List[Tuple[object, float]]:
+        """Return (embeddings _id, score) for the best chunks, best first"""
+        if self.index is None or self.index.ntotal == 0:
+            return []
+
+        params = None
+        candidates = self.index.ntotal
+        if document_ids:
+            labels = [self.document_labels[d] for d in document_ids if d in self.document_labels]
+            labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.int64)
+            if len(labels) == 0:
+                return []
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(labels))
+            candidates = len(labels)
+
+        scores, labels = self.index.search(query_vector[None], min(top_k, candidates), params=params)
+        return [
+            (self.chunk_ids[label], float(score))
+            for score, label in zip(scores[0].tolist(), labels[0].tolist())
+            if label >= 0
+        ]
+
+vector_index = VectorIndex()
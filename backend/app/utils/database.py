@@ -1,6 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel
+from pymongo.server_api import ServerApi
+from pymongo.write_concern import WriteConcern
+from pymongo.errors import CollectionInvalid
 from typing import Optional
+import asyncio
 import logging
 from ..config import settings
 
@@ -10,9 +14,16 @@ class Database:
     client: Optional[AsyncIOMotorClient] = None
     db = None
     gridfs: Optional[AsyncIOMotorGridFSBucket] = None
+    audit_logs = None
 
 db = Database()
 
+# Identifies this service's connections in server logs and currentOp
+MONGODB_APP_NAME = "ai-synapse-ocr"
+
+# Collections holding the bulky OCR output and uploads; WiredTiger stores them zstd-compressed
+ZSTD_COLLECTIONS = ("documents", "embeddings", "fs.chunks")
+
 async def connect_to_mongo():
     """Connect to MongoDB"""
     try:
@@ -20,16 +31,25 @@ async def connect_to_mongo():
         db.client = AsyncIOMotorClient(
             settings.MONGODB_URL,
             maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
-            minPoolSize=settings.MONGODB_MIN_POOL_SIZE
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            compressors=settings.MONGODB_COMPRESSORS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            readPreference=settings.MONGODB_READ_PREFERENCE,
+            appname=MONGODB_APP_NAME,
+            server_api=ServerApi("1")
         )
         db.db = db.client[settings.MONGODB_DB_NAME]
         db.gridfs = AsyncIOMotorGridFSBucket(db.db)
+        # Audit entries are best-effort; don't wait for a server ack on the request path
+        db.audit_logs = db.db.get_collection("audit_logs", write_concern=WriteConcern(w=0))
         
         # Test connection
         await db.client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
         
-        # Create indexes
+        # Create collections and indexes
+        await create_compressed_collections()
         await create_indexes()
         
     except Exception as e:
@@ -45,32 +65,77 @@ async def close_mongo_connection():
     except Exception as e:
         logger.error(f"Error closing MongoDB connection: {e}")
 
+async def create_compressed_collections():
+    """Create the bulky collections with zstd block compression if they don't exist yet"""
+    existing = set(await db.db.list_collection_names())
+    results = await asyncio.gather(
+        *(
+            db.db.create_collection(
+                name,
+                storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+            )
+            for name in ZSTD_COLLECTIONS
+            if name not in existing
+        ),
+        return_exceptions=True
+    )
+    # Another process may have created a collection first; that's fine
+    for result in results:
+        if isinstance(result, Exception) and not isinstance(result, CollectionInvalid):
+            logger.error(f"Error creating collection: {result}")
+
 async def create_indexes():
     """Create database indexes"""
-    try:
-        # Documents collection
-        await db.db.documents.create_index("user_id")
-        await db.db.documents.create_index("created_at")
-        await db.db.documents.create_index("status")
-        
-        # Users collection
-        await db.db.users.create_index("email", unique=True)
-        await db.db.users.create_index("created_at")
-        
-        # Audit logs collection
-        await db.db.audit_logs.create_index("user_id")
-        await db.db.audit_logs.create_index("timestamp")
-        await db.db.audit_logs.create_index("action")
-        
-        # Vector embeddings (if using MongoDB Atlas Vector Search)
-        # await db.db.embeddings.create_index([("vector", "vector")])
-        
+    # One createIndexes command per collection, all sent concurrently. Single-field
+    # indexes that are a prefix of a compound index below are left out as redundant.
+    indexes = {
+        "documents": [
+            IndexModel("created_at"),
+            IndexModel([("user_id", 1), ("created_at", -1), ("_id", -1)]),
+            IndexModel([("user_id", 1), ("status", 1), ("created_at", -1)]),
+            IndexModel([("status", 1), ("created_at", -1)]),
+            IndexModel([("status", 1), ("updated_at", -1)]),
+            # Covers the vector index's periodic scan for embedded documents
+            IndexModel([("embeddings_generated", 1), ("_id", 1)]),
+        ],
+        "users": [
+            IndexModel("email", unique=True),
+            IndexModel("created_at"),
+            IndexModel("is_active"),
+        ],
+        "query_history": [
+            IndexModel([("user_id", 1), ("timestamp", -1), ("_id", -1)]),
+            IndexModel("timestamp"),
+        ],
+        "embeddings": [
+            IndexModel("document_id"),
+        ],
+        "audit_logs": [
+            IndexModel([("user_id", 1), ("timestamp", -1)]),
+            IndexModel("timestamp"),
+            IndexModel("action"),
+        ],
+    }
+    
+    results = await asyncio.gather(
+        *(db.db[name].create_indexes(models) for name, models in indexes.items()),
+        return_exceptions=True
+    )
+    
+    failed = False
+    for name, result in zip(indexes, results):
+        if isinstance(result, Exception):
+            failed = True
+            logger.error(f"Error creating indexes on {name}: {result}")
+    
+    if not failed:
         logger.info("Database indexes created successfully")
-    except Exception as e:
-        logger.error(f"Error creating indexes: {e}")
 
 def get_database():
     return db.db
 
 def get_gridfs():
-    return db.gridfs
\ No newline at end of file
+    return db.gridfs
+
+def get_audit_logs():
+    return db.audit_logs
\ No newline at end of file
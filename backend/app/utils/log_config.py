@@ -0,0 +1,19 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+def setup_logging() -> QueueListener:
+    """Configure root logging for a process; stop the returned listener on shutdown"""
+    # Handlers only enqueue records, a background thread writes them
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
\ No newline at end of file
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+# Response header carrying the keyset cursor for the next page of a list endpoint
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Bounds on the page size list endpoints accept
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Separates the timestamp from the _id tie-breaker in a cursor
+CURSOR_SEPARATOR = "_"
+
+def encode_cursor(row: dict, field: str) -> str:
+    """Keyset cursor pointing just past a row, ordered by (field, _id)"""
+    return f"{row[field].isoformat()}{CURSOR_SEPARATOR}{row['_id']}"
+
+def keyset_filter(field: str, cursor: Optional[str]) -> dict:
+    """Filter selecting rows after a cursor in (field desc, _id desc) order"""
+    if not cursor:
+        return {}
+    
+    try:
+        timestamp, _, row_id = cursor.rpartition(CURSOR_SEPARATOR)
+        after = datetime.fromisoformat(timestamp)
+        after_id = ObjectId(row_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    
+    # Timestamps aren't unique; rows sharing the cursor's timestamp are ordered by _id
+    return {"$or": [
+        {field: {"$lt": after}},
+        {field: after, "_id": {"$lt": after_id}},
+    ]}
@@ -0,0 +1,40 @@
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from typing import Optional
+import logging
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+redis_settings = RedisSettings.from_dsn(settings.REDIS_URL)
+
+class TaskQueue:
+    pool: Optional[ArqRedis] = None
+
+queue = TaskQueue()
+
+async def connect_to_redis():
+    """Connect to the Redis-backed job queue"""
+    try:
+        logger.info(f"Connecting to Redis at {settings.REDIS_URL}")
+        queue.pool = await create_pool(redis_settings)
+        logger.info("Successfully connected to Redis")
+    except Exception as e:
+        logger.error(f"Failed to connect to Redis: {e}")
+        raise
+
+async def close_redis_connection():
+    """Close Redis connection"""
+    try:
+        if queue.pool:
+            await queue.pool.close()
+            logger.info("Closed Redis connection")
+    except Exception as e:
+        logger.error(f"Error closing Redis connection: {e}")
+
+def get_task_queue() -> ArqRedis:
+    return queue.pool
+
+def get_redis() -> Optional[ArqRedis]:
+    """Shared Redis connection, also used for caching; None until connected"""
+    return queue.pool
@@ -0,0 +1,52 @@
+import asyncio
+
+from .config import settings
+from .routers.ocr import process_document_background, requeue_document, mark_document_failed, ocr_service
+from .utils.database import connect_to_mongo, close_mongo_connection
+from .utils.task_queue import redis_settings, connect_to_redis, close_redis_connection
+from .utils.log_config import setup_logging
+
+# A full OCR + embedding run on a large PDF can take a while. The task enforces this itself
+# so a timeout can be told apart from a shutdown cancel; arq's job timeout is only a backstop
+DOCUMENT_PROCESSING_TIMEOUT = 60 * 60
+MAX_TRIES = 3
+
+async def process_document_task(ctx, document_id: str):
+    """Queue entry point for OCR processing"""
+    try:
+        await asyncio.wait_for(process_document_background(document_id), DOCUMENT_PROCESSING_TIMEOUT)
+    except asyncio.TimeoutError:
+        await mark_document_failed(document_id, "Processing timed out")
+    except asyncio.CancelledError:
+        # Cancelled by worker shutdown: arq runs the job again, so hand the document back
+        # to the queue unless this was its last try
+        if ctx['job_try'] >= MAX_TRIES:
+            await mark_document_failed(document_id, "Processing was interrupted too many times")
+        else:
+            await requeue_document(document_id)
+        raise
+
+async def startup(ctx):
+    # The worker never imports app.main, so it sets up its own log output
+    ctx['log_listener'] = setup_logging()
+    await connect_to_mongo()
+    # Shared connection for the embedding cache
+    await connect_to_redis()
+    # Load OCR models before the first job instead of on its first page
+    if settings.OCR_WARMUP:
+        await asyncio.get_event_loop().run_in_executor(None, ocr_service.warm_up)
+
+async def shutdown(ctx):
+    await close_redis_connection()
+    await close_mongo_connection()
+    ctx['log_listener'].stop()
+
+# Run with: arq app.worker.WorkerSettings
+class WorkerSettings:
+    functions = [process_document_task]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = redis_settings
+    max_jobs = settings.MAX_CONCURRENT_OCR
+    max_tries = MAX_TRIES
+    job_timeout = DOCUMENT_PROCESSING_TIMEOUT + 60
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("tesserocr")
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+from app.services.table_detection_service import TableDetectionService, LINE_LENGTH, DETECTION_SCALE
+
+requires_cuda = pytest.mark.skipif(
+    cv2.cuda.getCudaEnabledDeviceCount() == 0,
+    reason="OpenCV has no CUDA device"
+)
+
+def synthetic_binary_page() -> np.ndarray:
+    """A preprocessed-looking 0/255 page: a ruled 4x5 grid plus some short text strokes"""
+    page = np.full((400, 600), 255, dtype=np.uint8)
+    for y in range(50, 351, 75):
+        page[y:y + 2, 60:541] = 0
+    for x in range(60, 541, 96):
+        page[50:352, x:x + 2] = 0
+    for y, x in ((80, 80), (160, 200), (240, 330), (310, 450)):
+        page[y:y + 8, x:x + 20:3] = 0
+    return page
+
+@requires_cuda
+def test_gpu_line_mask_matches_cpu():
+    service = TableDetectionService()
+    line_length = LINE_LENGTH // DETECTION_SCALE
+    page = synthetic_binary_page()
+    
+    cpu_mask = service._line_mask(page, line_length)
+    gpu_mask = service._line_mask_gpu(page, line_length)
+    
+    # The white background must stay background on both paths
+    assert cpu_mask[0:40, :].max() == 0
+    # Border handling of the two morphology implementations may differ at the image edge
+    margin = line_length
+    assert np.array_equal(
+        cpu_mask[margin:-margin, margin:-margin],
+        gpu_mask[margin:-margin, margin:-margin]
+    )
\ No newline at end of file
@@ -28,6 +28,8 @@ export const OCRProcessingPage = () => {
     if (!status) return 'Ready to start processing';
     
     switch (status.status) {
+      case 'queued':
+        return 'Waiting for a free OCR worker...';
       case 'preprocessing':
         return 'Preprocessing document...';
       case 'ocr_processing':
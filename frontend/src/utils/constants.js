@@ -10,6 +10,7 @@ export const USER_ROLES = {
 
 export const DOCUMENT_STATUS = {
   UPLOADED: 'uploaded',
+  QUEUED: 'queued',
   PREPROCESSING: 'preprocessing',
   OCR_PROCESSING: 'ocr_processing',
   TABLE_EXTRACTION: 'table_extraction',